@@ -0,0 +1,126 @@
+"""
+Syntax highlighting for code blocks, shared by the HTML, PDF and DOCX exporters.
+
+Code is tokenized once with Pygments into (category, text) spans, using a
+handful of categories (keyword, string, comment...). Each exporter turns the
+spans into its own markup: CSS classes on the page, where the dark theme
+lives in static/tutorial.css, and the colors of PRINT_COLORS in the PDF
+fallback and the DOCX, which have light code backgrounds.
+
+Tutorials repeat the same snippets across sections and regenerations, so
+spans are memoized per process under (language, code hash).
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+
+try:
+    from pygments.lexers import get_lexer_by_name
+    from pygments.token import Comment, Keyword, Name, Number, Operator, String
+    from pygments.util import ClassNotFound
+
+    # Checked in order; a token belongs to the first type it is a subtype of
+    TOKEN_CATEGORIES = (
+        (Comment, "comment"),
+        (String, "string"),
+        (Number, "number"),
+        (Keyword, "keyword"),
+        (Operator.Word, "keyword"),
+        (Name.Builtin, "builtin"),
+        (Name.Exception, "builtin"),
+        (Name.Function, "function"),
+        (Name.Class, "function"),
+        (Name.Decorator, "function"),
+        (Name.Tag, "tag"),
+    )
+except ImportError:  # pragma: no cover - pygments is in requirements.txt
+    get_lexer_by_name = None
+    TOKEN_CATEGORIES = ()
+
+HIGHLIGHT_CACHE_SIZE = int(os.getenv("HIGHLIGHT_CACHE_SIZE", "2048"))
+# Longer code is left plain: lexing it costs more than the colors are worth
+HIGHLIGHT_MAX_CHARS = int(os.getenv("HIGHLIGHT_MAX_CHARS", "20000"))
+
+# (category, text); "" is plain text
+Span = Tuple[str, str]
+
+# Category -> (color, bold, italic) on a light background
+PRINT_COLORS = {
+    "keyword": ("#d73a49", True, False),
+    "string": ("#032f62", False, False),
+    "number": ("#005cc5", False, False),
+    "comment": ("#6a737d", False, True),
+    "function": ("#6f42c1", False, False),
+    "builtin": ("#005cc5", False, False),
+    "tag": ("#22863a", False, False),
+}
+
+_cache: "OrderedDict[Tuple[str, str], Tuple[Span, ...]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def token_category(token_type) -> str:
+    for parent, category in TOKEN_CATEGORIES:
+        if token_type in parent:
+            return category
+    return ""
+
+@lru_cache(maxsize=64)
+def lexer_for(language: str):
+    """The Pygments lexer for a fence's language, or None: unknown languages are not guessed."""
+    if get_lexer_by_name is None or not language:
+        return None
+    try:
+        # Keep the code exactly as written, leading and trailing newlines included
+        return get_lexer_by_name(language, stripnl=False, ensurenl=False)
+    except ClassNotFound:
+        return None
+
+def _tokenize(code: str, language: str) -> Tuple[Span, ...]:
+    lexer = lexer_for(language)
+    if lexer is None:
+        return (("", code),)
+    spans = []
+    category, pieces = "", []
+    for token_type, text in lexer.get_tokens(code):
+        token = token_category(token_type)
+        if token != category and pieces:
+            spans.append((category, "".join(pieces)))
+            pieces = []
+        category = token
+        pieces.append(text)
+    if pieces:
+        spans.append((category, "".join(pieces)))
+    return tuple(spans)
+
+def highlight(code: str, language: str) -> Tuple[Span, ...]:
+    """Code as (category, text) spans, memoized under (language, code hash)."""
+    if len(code) > HIGHLIGHT_MAX_CHARS:
+        return (("", code),)
+    key = (language.lower(), hashlib.sha256(code.encode("utf-8", "surrogatepass")).hexdigest())
+    with _cache_lock:
+        spans = _cache.get(key)
+        if spans is not None:
+            _cache.move_to_end(key)
+            return spans
+
+    try:
+        spans = _tokenize(code, key[0])
+    except Exception as e:
+        print(f"⚠️  Highlighting {key[0]} code failed: {str(e)[:100]}")
+        spans = (("", code),)
+
+    with _cache_lock:
+        _cache[key] = spans
+        if len(_cache) > HIGHLIGHT_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return spans
+
+def print_style(category: str) -> Optional[Tuple[str, bool, bool]]:
+    """(color, bold, italic) of a category for PDFs and DOCX files; None for plain text."""
+    return PRINT_COLORS.get(category)
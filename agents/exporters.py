@@ -0,0 +1,382 @@
+"""
+Tutorial export: the HTML page, PDF, DOCX and Markdown.
+
+The HTML is written when the run finishes, since it is cheap and the client
+shows it right away. The tutorial itself is stored once as JSON under its
+content hash; PDF, DOCX and Markdown are rendered from it on first request,
+in a process pool, and cached on disk. PDFs are laid out per section
+(agents/pdf_sections.py); DOCX files are streamed from a template package
+(agents/docx_writer.py).
+
+While a run is in progress, LiveTutorialPage writes its page section by
+section, so the client can show sections as they finish.
+"""
+
+import os
+import json
+import hashlib
+import threading
+import multiprocessing
+import concurrent.futures
+from typing import Callable, Dict, List, Optional, Tuple
+
+from jinja2 import Environment, FileSystemLoader
+from markupsafe import Markup
+
+from agents.markdown_renderer import parse_markdown, render_html
+from utils.static_assets import asset_url, read_asset
+from utils.file_serving import precompress
+
+TUTORIAL_DIR = "generated_tutorials"
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+# Formats rendered on request from the stored tutorial, and those to render as soon as it is saved
+ARTIFACT_FORMATS = ("pdf", "docx", "md")
+PRERENDER_FORMATS = [fmt.strip().lower() for fmt in os.getenv("PRERENDER_FORMATS", "").split(",")
+                     if fmt.strip().lower() in ARTIFACT_FORMATS]
+# Bump when an exporter's output changes, so cached artifacts are rendered again
+RENDER_VERSION = 6
+# Pygments lexers loaded in every export worker before its first job
+WARM_LANGUAGES = ("python", "javascript", "typescript", "bash", "json", "yaml", "html")
+
+_export_pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+
+
+# Page markup lives in Jinja2 templates, compiled once at import; the CSS is a
+# shared static asset linked by its fingerprinted URL
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+_templates = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=True, auto_reload=False,
+                         trim_blocks=True, lstrip_blocks=True, keep_trailing_newline=True)
+_page_template = _templates.get_template("page.html.j2")
+_tutorial_template = _templates.get_template("tutorial.html.j2")
+_shell_template = _templates.get_template("tutorial_shell.html.j2")
+_header_template = _templates.get_template("_header.html.j2")
+_toc_template = _templates.get_template("_toc.html.j2")
+_section_template = _templates.get_template("_section.html.j2")
+_footer_template = _templates.get_template("_footer.html.j2")
+
+TUTORIAL_STYLESHEET = "tutorial.css"
+# Print styling for PDFs: white page instead of the gradient
+PDF_CSS = read_asset(TUTORIAL_STYLESHEET).replace(
+    'background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);', 'background: white;')
+
+def section_display_title(section: dict) -> str:
+    return section.get('title', 'Section').replace("## ", "").replace("# ", "")
+
+def template_section(number: int, section: dict, page: Optional[int] = None, with_content: bool = False) -> dict:
+    """What the templates need to know about a section, numbered from 1."""
+    context = {"number": number, "title": section_display_title(section), "page": page}
+    if with_content:
+        context["content_html"] = Markup(render_html(section.get('blocks') or parse_markdown(section.get('content', ''))))
+    return context
+
+def toc_html(sections: list, page_numbers: Optional[List[int]] = None) -> str:
+    """The table of contents; with page_numbers (for PDFs) each entry shows its page."""
+    return _toc_template.render(sections=[
+        template_section(i + 1, section, page_numbers[i] if page_numbers else None)
+        for i, section in enumerate(sections)
+    ])
+
+def header_html(title: str, metadata: dict, section_count: int) -> str:
+    """Title banner and metadata strip at the top of the page."""
+    return _header_template.render(title=title, metadata=metadata, sections=range(section_count))
+
+def section_html(number: int, section: dict) -> str:
+    return _section_template.render(section=template_section(number, section, with_content=True))
+
+def footer_html() -> str:
+    return _footer_template.render()
+
+def html_document(title: str, body: str, stylesheet_url: Optional[str] = None) -> str:
+    """Wrap body in a full page; without stylesheet_url styling is left to the renderer (PDFs)."""
+    return _page_template.render(title=title, body=Markup(body), stylesheet_url=stylesheet_url)
+
+def create_beautiful_html(title: str, sections: list, metadata: dict) -> str:
+    """Create a beautiful, elegant HTML document with modern styling."""
+    return _tutorial_template.render(
+        title=title,
+        metadata=metadata,
+        sections=[template_section(i + 1, section, with_content=True) for i, section in enumerate(sections)],
+        stylesheet_url=asset_url(TUTORIAL_STYLESHEET)
+    )
+
+def live_page_path(run_id: str, output_dir: str = TUTORIAL_DIR) -> str:
+    return os.path.join(output_dir, "live", f"{run_id}.html")
+
+class LiveTutorialPage:
+    """The tutorial page of a run in progress, written while sections are generated.
+
+    open() writes the shell (header and table of contents) as soon as the
+    outline exists; add_section() appends each finished section to the file
+    and returns it as an HTML fragment for the client. A section retried after
+    later ones is appended after them; finish() replaces the file with the
+    compiled page, in outline order.
+    """
+
+    def __init__(self, run_id: str, output_dir: str = TUTORIAL_DIR):
+        self.path = live_page_path(run_id, output_dir)
+        self.sections: Optional[list] = None
+        self.written: set = set()
+
+    @property
+    def complete(self) -> bool:
+        """Every section of the outline has been added."""
+        return self.sections is not None and len(self.written) == len(self.sections)
+
+    def open(self, outline: dict, metadata: dict) -> str:
+        """Start the page over with the shell for outline; returns the shell HTML."""
+        self.sections = outline.get('sections', [])
+        self.written = set()
+        shell = _shell_template.render(
+            title=outline.get('title', 'Comprehensive Tutorial'),
+            metadata=metadata,
+            sections=[template_section(i + 1, section) for i, section in enumerate(self.sections)],
+            stylesheet_url=asset_url(TUTORIAL_STYLESHEET)
+        )
+        self._write(shell)
+        return shell
+
+    def add_section(self, section_key: str, content: str) -> Optional[str]:
+        """Append a finished section; returns its HTML fragment (None if already added)."""
+        if self.sections is None or section_key in self.written:
+            return None
+        number = int(section_key) + 1
+        fragment = section_html(number, {"title": self.sections[number - 1].get('title', 'Section'), "content": content})
+        self.written.add(section_key)
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(fragment)
+        except OSError as e:
+            print(f"⚠️  Could not append section {number} to {self.path}: {e}")
+        return fragment
+
+    def finish(self, html_content: str) -> None:
+        """Replace the page with the compiled tutorial."""
+        if self.sections is not None and html_content:
+            self._write(html_content)
+
+    def _write(self, html: str) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(html)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️  Could not write {self.path}: {e}")
+
+def export_pool() -> concurrent.futures.ProcessPoolExecutor:
+    """The shared process pool for PDF/DOCX rendering, started on first use.
+
+    Workers are spawned rather than forked: the server process runs threads
+    and an event loop that must not be copied into children.
+    """
+    global _export_pool
+    if _export_pool is None:
+        _export_pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=EXPORT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=warm_up_worker
+        )
+    return _export_pool
+
+def warm_up_worker() -> None:
+    """Export worker initializer: load the renderers and their cached resources
+    (WeasyPrint and its stylesheet or the ReportLab styles, the DOCX template,
+    common lexers) so the first export does not pay for them."""
+    # An initializer that raises breaks the whole pool, and every step here is only an optimization
+    try:
+        from agents import pdf_sections, pdf_fallback, docx_writer
+        from agents.code_highlight import lexer_for
+        import pypdf  # noqa: F401 - merges the section PDFs
+
+        if pdf_sections.weasyprint_resources() is None:
+            pdf_fallback.pdf_styles()
+            pdf_fallback.code_block_class()
+        docx_writer.template_parts()
+        for language in WARM_LANGUAGES:
+            lexer_for(language)
+    except Exception as e:
+        print(f"⚠️  Export worker warm-up failed: {str(e)[:100]}")
+
+def start_export_pool() -> None:
+    """Spawn the export workers ahead of the first tutorial, so it does not wait for them to start."""
+    pool = export_pool()
+    # Workers are spawned on submit; each runs warm_up_worker before taking the job
+    for _ in range(EXPORT_WORKERS):
+        pool.submit(os.getpid)
+
+def shutdown_export_pool() -> None:
+    global _export_pool
+    if _export_pool is not None:
+        _export_pool.shutdown(wait=True, cancel_futures=True)
+        _export_pool = None
+
+def submit_export(fn: Callable, *args) -> concurrent.futures.Future:
+    """Run an exporter in the process pool; if the pool is unusable, run it here instead."""
+    global _export_pool
+    try:
+        return export_pool().submit(fn, *args)
+    except Exception as e:
+        # A worker crash breaks the whole pool; start a fresh one next time
+        print(f"⚠️  Export pool unavailable, rendering in-process: {e}")
+        _export_pool = None
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as export_error:
+            future.set_exception(export_error)
+        return future
+
+def tutorial_markdown(title: str, sections: list, metadata: dict) -> str:
+    """The tutorial as one Markdown document."""
+    final_md = f"# {title}\n\n"
+    final_md += f"*Generated on: {metadata.get('generated_at', 'Unknown')}*\n\n"
+    final_md += f"*Source: {metadata.get('source_query', 'Unknown')}*\n\n"
+    final_md += "---\n\n"
+    
+    for i, section in enumerate(sections):
+        final_md += f"## {i+1}. {section.get('title', 'Section')}\n\n"
+        final_md += section.get('content', '') + "\n\n"
+    return final_md
+
+def tutorial_path(tutorial_id: str, output_dir: str = TUTORIAL_DIR) -> str:
+    return os.path.join(output_dir, "tutorials", f"{tutorial_id}.json")
+
+def artifact_path(tutorial_id: str, fmt: str, output_dir: str = TUTORIAL_DIR) -> str:
+    # The renderer version is part of the name so renderer changes never serve stale files
+    return os.path.join(output_dir, "artifacts", f"{tutorial_id}.v{RENDER_VERSION}.{fmt}")
+
+def save_tutorial(title: str, sections: list, metadata: dict, output_dir: str = TUTORIAL_DIR) -> str:
+    """Store the canonical tutorial as JSON under its content hash; returns the tutorial id."""
+    payload = json.dumps({"title": title, "metadata": metadata,
+                          "sections": [{"title": s.get('title', 'Section'), "content": s.get('content', '')}
+                                       for s in sections]},
+                         ensure_ascii=False, sort_keys=True)
+    tutorial_id = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+    path = tutorial_path(tutorial_id, output_dir)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    return tutorial_id
+
+def load_tutorial(tutorial_id: str, output_dir: str = TUTORIAL_DIR) -> Optional[dict]:
+    try:
+        with open(tutorial_path(tutorial_id, output_dir), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def render_artifact_file(tutorial_file: str, fmt: str, path: str) -> bool:
+    """Render a stored tutorial as DOCX or Markdown to path. Runs in an export worker."""
+    with open(tutorial_file, 'r', encoding='utf-8') as f:
+        tutorial = json.load(f)
+    title, metadata = tutorial["title"], tutorial["metadata"]
+    # Parse each section once for whichever exporter runs
+    sections = [dict(section, blocks=parse_markdown(section['content'])) for section in tutorial["sections"]]
+    
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written under a temporary name so a half-rendered file is never served
+    tmp_path = f"{path}.{os.getpid()}.tmp.{fmt}"
+    try:
+        if fmt == "docx":
+            from agents.docx_writer import write_docx
+
+            ok = write_docx(title, sections, metadata, tmp_path)
+        else:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(tutorial_markdown(title, sections, metadata))
+            ok = True
+        if ok:
+            os.replace(tmp_path, path)
+            precompress(path)
+        return ok
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+_pdf_coordinator = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="pdf-merge")
+
+# Renders in flight by artifact path; concurrent requests for one artifact share a render
+_inflight: Dict[str, concurrent.futures.Future] = {}
+_inflight_lock = threading.Lock()
+
+def render_artifact(tutorial_id: str, fmt: str, output_dir: str = TUTORIAL_DIR) -> concurrent.futures.Future:
+    """A future for the path of the rendered artifact (None if rendering failed).
+
+    Served from the disk cache when already rendered; otherwise the first
+    request starts a render in the export pool and later ones wait on it.
+    """
+    path = artifact_path(tutorial_id, fmt, output_dir)
+    with _inflight_lock:
+        future = _inflight.get(path)
+        if future is not None:
+            return future
+        if os.path.exists(path):
+            future = concurrent.futures.Future()
+            future.set_result(path)
+            return future
+        
+        result: concurrent.futures.Future = concurrent.futures.Future()
+        _inflight[path] = result
+    
+    def finish(render: concurrent.futures.Future) -> None:
+        try:
+            ok = render.result()
+        except Exception as e:
+            print(f"❌ Rendering {fmt.upper()} for tutorial {tutorial_id} failed: {e}")
+            ok = False
+        with _inflight_lock:
+            _inflight.pop(path, None)
+        result.set_result(path if ok else None)
+    
+    if fmt == "pdf":
+        # Coordinated from a thread here: sections render in parallel in the pool, then merge
+        from agents.pdf_sections import render_tutorial_pdf
+        render = _pdf_coordinator.submit(render_tutorial_pdf, load_tutorial(tutorial_id, output_dir), path, submit_export)
+    else:
+        render = submit_export(render_artifact_file, tutorial_path(tutorial_id, output_dir), fmt, path)
+    render.add_done_callback(finish)
+    return result
+
+def save_premium_formats(title: str, sections: list, metadata: dict, safe_title: str, timestamp: str,
+                         output_dir: str = TUTORIAL_DIR) -> Tuple[List[Tuple[str, str, str]], Dict[str, str]]:
+    """Save the tutorial page (HTML) and the canonical tutorial that PDF, DOCX and Markdown render from.
+
+    Returns the saved files as (format, path, content) and every available
+    artifact as {format: file name under /tutorial}. PDF, DOCX and Markdown
+    render on first request; PRERENDER_FORMATS starts them right away.
+    """
+    saved_files = []
+    # Parse each section once for the page
+    sections = [dict(section, blocks=parse_markdown(section.get('content', ''))) for section in sections]
+    
+    # 1. Create Beautiful HTML
+    try:
+        html_content = create_beautiful_html(title, sections, metadata)
+        
+        html_filename = f"{safe_title}_{timestamp}.html"
+        html_filepath = os.path.join(output_dir, html_filename)
+        with open(html_filepath, 'w', encoding='utf-8') as f:
+            f.write(html_content)
+        precompress(html_filepath)
+        saved_files.append(("HTML", html_filepath, html_content))
+        print(f"✅ Beautiful HTML saved: {html_filepath}")
+    except Exception as e:
+        print(f"❌ Error saving HTML: {e}")
+    
+    # 2. Canonical tutorial for on-demand PDF/DOCX/Markdown
+    artifacts = {format_name: os.path.basename(filepath) for format_name, filepath, _ in saved_files}
+    try:
+        tutorial_id = save_tutorial(title, sections, metadata, output_dir)
+        print(f"✅ Tutorial data saved: {tutorial_path(tutorial_id, output_dir)}")
+        for fmt in ARTIFACT_FORMATS:
+            artifacts[fmt.upper()] = f"{tutorial_id}.{fmt}"
+        for fmt in PRERENDER_FORMATS:
+            render_artifact(tutorial_id, fmt, output_dir)
+    except Exception as e:
+        print(f"❌ Error saving tutorial data: {e}")
+    
+    return saved_files, artifacts
@@ -1,145 +1,515 @@
 import os
 import sys
 import json
+import hashlib
 import re
-from typing import TypedDict, List, Dict
+import time
+import concurrent.futures
+from typing import TypedDict, Annotated, List, Dict, Tuple, Callable, Optional
 from langgraph.graph import StateGraph, END
-from openai import OpenAI
+from langchain_core.runnables import RunnableConfig
+from openai import OpenAI, AuthenticationError, PermissionDeniedError
 from openai.types.chat import ChatCompletionMessageParam
+from pydantic import BaseModel, Field, ValidationError
 from dotenv import load_dotenv
 import datetime
 
+from utils.llm_cache import LLMCache, CacheMissError
+from utils.provider_health import ProviderHealth
+from utils.rate_limiter import LLMScheduler
+from utils.retry import RetryBudget, is_retryable, retry_after_seconds, backoff_delay
+from utils.token_budget import (UsageTracker, context_window, count_tokens, truncate_to_tokens, prompt_budget,
+                                MAX_CHARS_PER_TOKEN)
+from utils.blob_store import CorpusStore, PAGE_SEPARATOR, format_page
+from agents.exporters import save_premium_formats, tutorial_markdown
+
 load_dotenv()
 
 # --- Enhanced LLM Wrapper ---
+class LLMError(RuntimeError):
+    """An LLM call failed on every provider, after retries."""
+
+class CallDeadline:
+    """A time limit on one llm.invoke, counted from when the scheduler first admits one of its requests.
+
+    Time spent queued (in a caller's pool or the scheduler) does not count.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires: Optional[float] = None
+
+    def start(self) -> None:
+        if self.expires is None:
+            self.expires = time.monotonic() + self.seconds
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None before the call has started."""
+        return None if self.expires is None else max(0.0, self.expires - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() == 0.0
+
+class LLMProvider:
+    """One configured OpenAI-compatible chat endpoint and its health record."""
+
+    def __init__(self, name: str, label: str, api_key: Optional[str], base_url: str, model: str):
+        self.name = name
+        self.label = label
+        self.model = model
+        # Retries are handled by LLMWrapper so they can fail over and respect the retry budget
+        self.client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0,
+                             timeout=float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))) if api_key else None
+        self.health = ProviderHealth(name)
+
 class LLMWrapper:
+    # name, label, API key variable, placeholder value, base URL, model -- in order of preference
+    PROVIDERS = [
+        ("google", "Google Gemini", "GOOGLE_API_KEY", "your-google-gemini-api-key",
+         "https://generativelanguage.googleapis.com/v1beta/openai/", "gemini-2.0-flash"),
+        ("xai", "XAI (Grok)", "XAI_API_KEY", "your-xai-api-key",
+         "https://api.x.ai/v1", "grok-2-1212"),
+        ("deepseek", "DeepSeek", "DEEPSEEK_API_KEY", "your-deepseek-api-key",
+         "https://api.deepseek.com", "deepseek-chat")
+    ]
+    TEMPERATURE = 0.7
+    MAX_COMPLETION_TOKENS = 4000
+
     def __init__(self):
-        # Try to use Google Gemini first, then XAI, then DeepSeek
-        self.google_api_key = os.getenv('GOOGLE_API_KEY')
-        self.xai_api_key = os.getenv('XAI_API_KEY')
-        self.deepseek_api_key = os.getenv('DEEPSEEK_API_KEY')
-        
-        # Try Google first
-        if self.google_api_key and self.google_api_key != "your-google-gemini-api-key":
-            if self._setup_google():
-                return
-        
-        # Try XAI second
-        if self.xai_api_key and self.xai_api_key != "your-xai-api-key":
-            if self._setup_xai():
-                return
-        
-        # Try DeepSeek last
-        if self.deepseek_api_key and self.deepseek_api_key != "your-deepseek-api-key":
-            if self._setup_deepseek():
-                return
-        
-        raise ValueError("No valid API key found for Google Gemini, XAI, or DeepSeek")
-    
-    def _setup_google(self):
-        try:
-            self.client = OpenAI(
-                api_key=self.google_api_key, 
-                base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
-            )
-            self.model_name = "gemini-2.0-flash"
-            self.provider = "google"
-            
-            # Test the API with a simple call
-            test_response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[{"role": "user", "content": "test"}],
-                max_tokens=5
-            )
-            print("✅ Using Google Gemini API")
-            return True
-        except Exception as e:
-            print(f"❌ Google API failed: {str(e)[:100]}...")
-            return False
-    
-    def _setup_xai(self):
-        try:
-            self.client = OpenAI(
-                api_key=self.xai_api_key,
-                base_url="https://api.x.ai/v1"
-            )
-            self.model_name = "grok-2-1212"
-            self.provider = "xai"
-            
-            # Test the API with a simple call
-            test_response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[{"role": "user", "content": "test"}],
-                max_tokens=5
-            )
-            print("✅ Using XAI (Grok) API")
-            return True
-        except Exception as e:
-            print(f"❌ XAI API failed: {str(e)[:100]}...")
-            return False
-    
-    def _setup_deepseek(self):
-        try:
-            self.client = OpenAI(
-                api_key=self.deepseek_api_key,
-                base_url="https://api.deepseek.com"
-            )
-            self.model_name = "deepseek-chat"
-            self.provider = "deepseek"
-            
-            # Test the API with a simple call
-            test_response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[{"role": "user", "content": "test"}],
-                max_tokens=5
-            )
-            print("✅ Using DeepSeek API")
-            return True
-        except Exception as e:
-            print(f"❌ DeepSeek API failed: {str(e)[:100]}...")
-            return False
+        """Route calls across every provider with a configured key (Google Gemini, then XAI,
+        then DeepSeek), failing over at runtime based on each provider's health.
 
-    def invoke(self, prompt: str) -> str:
-        # Customize system prompt based on provider
-        if self.provider == "xai":
-            system_content = "You are Grok, a highly intelligent, helpful AI assistant that creates clear, comprehensive tutorials with excellent explanations and practical examples."
+        LLM_BASE_URL replaces them with a single OpenAI-compatible endpoint
+        (e.g. a local model server or benchmarks/mock_server.py).
+        """
+        self.cache = LLMCache.from_env()
+        # Hedging fires a second provider when the first is slower than its own latency percentile
+        self.hedge_enabled = os.getenv("LLM_HEDGE", "0") == "1"
+        self.hedge_percentile = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+        self.hedge_min_delay = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2"))
+        self._hedge_executor = concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-hedge")
+        # Transient failures (timeouts, 429, 5xx) are retried with jittered exponential backoff
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "3"))
+        self.retry_base_delay = float(os.getenv("LLM_RETRY_BASE_DELAY", "1"))
+        self.retry_max_delay = float(os.getenv("LLM_RETRY_MAX_DELAY", "30"))
+        self.retry_budget = RetryBudget(ratio=float(os.getenv("LLM_RETRY_BUDGET_RATIO", "0.2")))
+        
+        self.providers: List[LLMProvider] = []
+        custom_base_url = os.getenv("LLM_BASE_URL")
+        if custom_base_url:
+            # Local servers usually ignore the key, but the client requires one
+            self.providers.append(LLMProvider("custom", f"Custom ({custom_base_url})", os.getenv("LLM_API_KEY", "not-needed"),
+                                              custom_base_url, os.getenv("LLM_MODEL", "mock-model")))
         else:
-            system_content = "You are a world-class technical writer and educator that creates clear, comprehensive tutorials with excellent explanations, practical examples, and engaging content."
+            for name, label, key_var, placeholder, base_url, model in self.PROVIDERS:
+                api_key = os.getenv(key_var)
+                if api_key and api_key != placeholder:
+                    self.providers.append(LLMProvider(name, label, api_key, base_url, model))
+        
+        # Shared by every session in this process, including the /ask endpoint
+        self.scheduler = LLMScheduler.from_env([name for name, *_ in self.PROVIDERS] + ["custom"])
+        
+        # Replay mode answers from the cache only, so skip the provider probes
+        if self.cache.replay:
+            if not self.providers:
+                # A recording may come from any provider; keys are not needed to replay it
+                self.providers = [LLMProvider(name, label, None, base_url, model)
+                                  for name, label, _, _, base_url, model in self.PROVIDERS]
+            print(f"✅ Replaying LLM responses from cache '{self.cache.cache_dir}'")
+            return
+        
+        if not self.providers:
+            raise ValueError("No valid API key found for Google Gemini, XAI, or DeepSeek, and LLM_BASE_URL is not set")
+        self._probe_providers()
+
+    def _probe_providers(self):
+        """Send a tiny request to every provider so broken keys start with an open circuit."""
+        def probe(provider: LLMProvider):
+            started = time.monotonic()
+            try:
+                provider.client.chat.completions.create(
+                    model=provider.model,
+                    messages=[{"role": "user", "content": "test"}],
+                    max_tokens=5
+                )
+                provider.health.record_success(time.monotonic() - started)
+                print(f"✅ {provider.label} API available")
+            except Exception as e:
+                # Bad keys or endpoints open the circuit right away; a transient error is just counted
+                provider.health.record_failure(trip=not is_retryable(e))
+                print(f"❌ {provider.label} API failed: {str(e)[:100]}...")
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.providers)) as executor:
+            list(executor.map(probe, self.providers))
+        if all(p.health.state == "open" for p in self.providers):
+            print("⚠️  No LLM provider passed its probe; they will be retried once their circuits half-open")
+
+    def _ranked_providers(self) -> List[LLMProvider]:
+        preference = {p.name: i for i, p in enumerate(self.providers)}
+        return sorted(self.providers, key=lambda p: (p.health.state == "open", p.health.score(preference[p.name])))
+
+    @property
+    def primary(self) -> LLMProvider:
+        return self._ranked_providers()[0]
+
+    @property
+    def provider(self) -> str:
+        return self.primary.name
+
+    @property
+    def model_name(self) -> str:
+        return self.primary.model
+
+    def provider_status(self) -> Dict[str, Dict]:
+        return {p.name: dict(p.health.snapshot(), model=p.model) for p in self.providers}
+
+    @staticmethod
+    def system_prompt(provider: str) -> str:
+        # Customize system prompt based on provider
+        if provider == "xai":
+            return "You are Grok, a highly intelligent, helpful AI assistant that creates clear, comprehensive tutorials with excellent explanations and practical examples."
+        return "You are a world-class technical writer and educator that creates clear, comprehensive tutorials with excellent explanations, practical examples, and engaging content."
+
+    def _cache_key(self, provider: LLMProvider, prompt: str) -> str:
+        system_content = self.system_prompt(provider.name)
+        prompt = self.fit_prompt(prompt, system_content, provider.model)
+        return self.cache.make_key(provider.name, provider.model, self.TEMPERATURE, system_content, prompt)
+
+    def _cache_lookup(self, prompt: str) -> Optional[str]:
+        """Any provider's recorded answer will do. Raises CacheMissError on a miss in replay mode."""
+        if not self.cache.enabled:
+            return None
+        for provider in self.providers:
+            try:
+                cached = self.cache.get(self._cache_key(provider, prompt))
+            except CacheMissError:
+                continue
+            if cached is not None:
+                return cached
+        if self.cache.replay:
+            raise CacheMissError(f"No recorded LLM response for prompt: {prompt[:80]!r}...")
+        return None
+
+    def invoke(self, prompt: str, on_token: Optional[Callable[[str], None]] = None,
+               usage: Optional[UsageTracker] = None, node: str = "", section: str = "",
+               session: str = "", priority: int = LLMScheduler.BULK, json_mode: bool = False,
+               timeout: Optional[float] = None) -> str:
+        """Return the completion for prompt.
+
+        When on_token is given the completion is streamed and on_token receives
+        each text delta as it arrives; the full text is still returned.
+        json_mode asks the provider for a single JSON object (response_format json_object).
+        Raises LLMError when every provider failed and retries are exhausted.
+        Token counts and latency are recorded on usage under node/section.
+        Requests queue on the process-wide scheduler by priority, fairly across sessions.
+        timeout bounds the call in seconds from when its first request is admitted, so
+        queueing does not count: each request is sent with the time left as its HTTP
+        timeout, and no retry or failover starts after it has run out.
+        """
+        started = time.monotonic()
+        cached = self._cache_lookup(prompt)
+        if cached is not None:
+            if usage is not None:
+                usage.record(node, section, 0, 0, time.monotonic() - started, cached=True)
+            if on_token:
+                on_token(cached)
+            return cached
         
-        messages: List[ChatCompletionMessageParam] = [
-            {"role": "system", "content": system_content},
-            {"role": "user", "content": prompt}
-        ]
         try:
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=4000
-            )
-            content = response.choices[0].message.content
-            return content if content is not None else ""
+            provider, content, reported_usage = self._route(prompt, on_token, (priority, session), json_mode,
+                                                            CallDeadline(timeout) if timeout is not None else None)
         except Exception as e:
             print(f"LLM API call failed: {e}")
-            return f"Error generating content: {str(e)}"
+            raise LLMError(f"LLM call failed: {e}") from e
+        
+        if usage is not None:
+            # Prefer the provider's own counts; fall back to counting locally
+            prompt_tokens = getattr(reported_usage, "prompt_tokens", None)
+            completion_tokens = getattr(reported_usage, "completion_tokens", None)
+            if prompt_tokens is None:
+                prompt_tokens = count_tokens(self.system_prompt(provider.name), provider.model) + count_tokens(prompt, provider.model)
+            if completion_tokens is None:
+                completion_tokens = count_tokens(content, provider.model)
+            usage.record(node, section, prompt_tokens, completion_tokens,
+                         time.monotonic() - started, provider=provider.name)
+        if content:
+            self.cache.set(self._cache_key(provider, prompt), content, provider=provider.name, model=provider.model)
+        return content
+
+    def _route(self, prompt: str, on_token: Optional[Callable[[str], None]], admission=(LLMScheduler.BULK, ""),
+               json_mode: bool = False, deadline: Optional[CallDeadline] = None):
+        """Send the request, retrying transient failures with jittered exponential backoff.
+
+        Each attempt tries every available provider once. Retries stop after
+        max_retries, when the retry budget is spent, when the deadline would pass
+        during the backoff, or once a stream has already delivered tokens to the
+        caller (a retry would repeat them).
+        """
+        self.retry_budget.record_request()
+        streamed = False
+        
+        def forward(delta: str) -> None:
+            nonlocal streamed
+            streamed = True
+            on_token(delta)
+        
+        attempt = 0
+        while True:
+            try:
+                return self._route_once(prompt, forward if on_token else None, admission, json_mode,
+                                        lambda: streamed, deadline)
+            except Exception as e:
+                if streamed or not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                delay = max(backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay),
+                            retry_after_seconds(e) or 0.0)
+                remaining = deadline.remaining() if deadline else None
+                if (remaining is not None and delay >= remaining) or not self.retry_budget.try_spend():
+                    raise
+                attempt += 1
+                print(f"🔁 Transient LLM error ({str(e)[:100]}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _route_once(self, prompt: str, on_token: Optional[Callable[[str], None]], admission, json_mode: bool,
+                    streamed: Callable[[], bool], deadline: Optional[CallDeadline] = None):
+        """Try providers from healthiest to least healthy, skipping open circuits."""
+        remaining = [p for p in self._ranked_providers() if p.client is not None]
+        last_error: Optional[Exception] = None
+        while remaining:
+            # Checked first: allow_request() reserves a half-open provider's trial slot
+            if deadline and deadline.expired():
+                break
+            provider = remaining.pop(0)
+            if not provider.health.allow_request():
+                continue
+            try:
+                # Streams have already been forwarded token by token, so only plain calls are hedged
+                if self.hedge_enabled and on_token is None:
+                    return self._call_hedged(provider, remaining, prompt, admission, json_mode, deadline)
+                content, reported_usage = self._call(provider, prompt, on_token, admission, json_mode, deadline)
+                return provider, content, reported_usage
+            except Exception as e:
+                last_error = e
+                if streamed():
+                    raise
+                if remaining:
+                    print(f"⚠️  {provider.label} failed ({str(e)[:100]}), failing over")
+        if last_error is None:
+            if deadline and deadline.expired():
+                raise TimeoutError(f"LLM call exceeded its {deadline.seconds:.0f}s limit")
+            raise RuntimeError("No LLM provider available: every circuit is open")
+        raise last_error
+
+    def _call_hedged(self, primary: LLMProvider, backups: List[LLMProvider], prompt: str, admission,
+                     json_mode: bool = False, deadline: Optional[CallDeadline] = None):
+        delay = primary.health.latency_percentile(self.hedge_percentile)
+        backup = next((p for p in backups if p.health.state == "closed"), None)
+        if delay is None or backup is None:
+            content, reported_usage = self._call(primary, prompt, None, admission, json_mode, deadline)
+            return primary, content, reported_usage
+        delay = max(delay, self.hedge_min_delay)
+        
+        futures = {self._hedge_executor.submit(self._call, primary, prompt, None, admission, json_mode, deadline): primary}
+        done, _ = concurrent.futures.wait(futures, timeout=delay)
+        if not done:
+            print(f"⏱️  {primary.label} slower than its p{self.hedge_percentile:.0f} ({delay:.1f}s), hedging with {backup.label}")
+            backups.remove(backup)
+            futures[self._hedge_executor.submit(self._call, backup, prompt, None, admission, json_mode, deadline)] = backup
+        
+        # First successful answer wins; the slower call finishes in the background
+        pending = set(futures)
+        first_error: Optional[Exception] = None
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                try:
+                    content, reported_usage = future.result()
+                    return futures[future], content, reported_usage
+                except Exception as e:
+                    first_error = first_error or e
+        raise first_error
+
+    def _call(self, provider: LLMProvider, prompt: str, on_token: Optional[Callable[[str], None]],
+              admission=(LLMScheduler.BULK, ""), json_mode: bool = False, deadline: Optional[CallDeadline] = None):
+        """One request to one provider. Updates the provider's health; raises on failure."""
+        sent = False
+        try:
+            system_content = self.system_prompt(provider.name)
+            prompt = self.fit_prompt(prompt, system_content, provider.model)
+            messages: List[ChatCompletionMessageParam] = [
+                {"role": "system", "content": system_content},
+                {"role": "user", "content": prompt}
+            ]
+            priority, session = admission
+            estimated_tokens = (count_tokens(system_content, provider.model) + count_tokens(prompt, provider.model)
+                                + self.MAX_COMPLETION_TOKENS)
+            with self.scheduler.slot(priority, session, provider.name, estimated_tokens) as ticket:
+                timeout = None
+                if deadline:
+                    deadline.start()
+                    timeout = deadline.remaining()
+                    if not timeout:
+                        raise TimeoutError(f"LLM call exceeded its {deadline.seconds:.0f}s limit")
+                # From here _send records the outcome on the provider's health
+                sent = True
+                content, reported_usage = self._send(provider, messages, on_token, json_mode, timeout)
+                if reported_usage is not None:
+                    ticket.actual_tokens = getattr(reported_usage, "total_tokens", None)
+        finally:
+            if not sent:
+                # Nothing reached the provider; a half-open trial slot must not stay reserved
+                provider.health.release_trial()
+        return content, reported_usage
+
+    def _send(self, provider: LLMProvider, messages: List[ChatCompletionMessageParam],
+              on_token: Optional[Callable[[str], None]], json_mode: bool = False, timeout: Optional[float] = None):
+        started = time.monotonic()
+        extra = {"response_format": {"type": "json_object"}} if json_mode else {}
+        if timeout is not None:
+            extra["timeout"] = timeout
+        try:
+            if on_token:
+                content, reported_usage = self._stream(provider, messages, on_token, extra)
+            else:
+                response = provider.client.chat.completions.create(
+                    model=provider.model,
+                    messages=messages,
+                    temperature=self.TEMPERATURE,
+                    max_tokens=self.MAX_COMPLETION_TOKENS,
+                    **extra
+                )
+                content = response.choices[0].message.content
+                reported_usage = getattr(response, "usage", None)
+        except (AuthenticationError, PermissionDeniedError):
+            # Bad credentials will not fix themselves on the next request
+            provider.health.record_failure(trip=True)
+            raise
+        except Exception:
+            provider.health.record_failure()
+            raise
+        provider.health.record_success(time.monotonic() - started)
+        return content if content is not None else "", reported_usage
+
+    def fit_prompt(self, prompt: str, system_content: str, model: str) -> str:
+        """Last-resort guard: trim a prompt that would overflow the model's context window."""
+        budget = prompt_budget(model, context_window(model),
+                               count_tokens(system_content, model), self.MAX_COMPLETION_TOKENS)
+        # Short prompts fit even at several tokens per character, skip the encode
+        if len(prompt) * 4 <= budget or count_tokens(prompt, model) <= budget:
+            return prompt
+        print(f"⚠️  Prompt exceeds the {model} context window, trimming to {budget} tokens")
+        return truncate_to_tokens(prompt, budget, model)
+
+    def _stream(self, provider: LLMProvider, messages: List[ChatCompletionMessageParam], on_token: Callable[[str], None],
+                extra: Optional[Dict] = None):
+        stream = provider.client.chat.completions.create(
+            model=provider.model,
+            messages=messages,
+            temperature=self.TEMPERATURE,
+            max_tokens=self.MAX_COMPLETION_TOKENS,
+            stream=True,
+            stream_options={"include_usage": True},
+            **(extra or {})
+        )
+        parts = []
+        reported_usage = None
+        for chunk in stream:
+            # With include_usage the last chunk carries usage and no choices
+            if getattr(chunk, "usage", None):
+                reported_usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                on_token(delta)
+        return "".join(parts), reported_usage
 
 # Initialize the LLM
 llm = LLMWrapper()
 
-# Define the enhanced state for our graph
+# Crawled corpora live on disk; graph state only carries a reference
+corpus_store = CorpusStore.from_env()
+
+# Prompt budgets, in tokens. Each is capped by the active model's context window.
+OUTLINE_CONTEXT_TOKENS = int(os.getenv("OUTLINE_CONTEXT_TOKENS", "6000"))
+SECTION_CONTEXT_TOKENS = int(os.getenv("SECTION_CONTEXT_TOKENS", "6000"))
+SECTION_CONTEXT_CHUNKS = int(os.getenv("SECTION_CONTEXT_CHUNKS", "24"))
+DRAFT_EXCERPT_TOKENS = 1250
+EXERCISE_EXCERPT_TOKENS = 750
+# Instructions and system prompt around the documentation context
+PROMPT_OVERHEAD_TOKENS = 1500
+
+# "multi": streamed draft plus three enrichment calls; "structured": one JSON call per section
+SECTION_MODE = os.getenv("SECTION_MODE", "multi").lower()
+
+# A section that fails is retried after the first pass over all sections, up to this many attempts in total
+SECTION_MAX_ATTEMPTS = int(os.getenv("SECTION_MAX_ATTEMPTS", "3"))
+OUTLINE_MAX_ATTEMPTS = int(os.getenv("OUTLINE_MAX_ATTEMPTS", "3"))
+
+# Concept/example/exercise prompts per section run on this shared pool; each call gets
+# ENRICHMENT_TIMEOUT seconds from when the scheduler admits it
+ENRICHMENT_TIMEOUT = float(os.getenv("ENRICHMENT_TIMEOUT", "90"))
+_enrichment_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.getenv("ENRICHMENT_WORKERS", "6")),
+    thread_name_prefix="enrichment"
+)
+
+# Map-reduce corpus summarization for the outline: input per call and target summary length
+SUMMARY_INPUT_TOKENS = int(os.getenv("SUMMARY_INPUT_TOKENS", "6000"))
+SUMMARY_TOKENS = int(os.getenv("SUMMARY_TOKENS", "400"))
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "8"))
+_summary_executor = concurrent.futures.ThreadPoolExecutor(max_workers=SUMMARY_WORKERS, thread_name_prefix="summary")
+
+def merge_dicts(left: Optional[Dict], right: Optional[Dict]) -> Dict:
+    """State reducer: nodes return only the entries they changed, merged over the current dict."""
+    return {**(left or {}), **(right or {})}
+
+# Define the enhanced state for our graph.
+# Nodes return only the keys they change, and the crawled corpus itself stays in
+# corpus_store, so state size does not grow with the size of the documentation.
 class GraphState(TypedDict):
     original_query: str
-    scraped_content: str
+    source_url: str
+    corpus_ref: str  # corpus_store reference of the crawled pages
+    corpus_digest: str  # map-reduce summary of a corpus too large for the outline prompt
+    corpus_id: str
     tutorial_outline: Dict
-    section_drafts: Dict[str, str]
+    section_drafts: Annotated[Dict[str, str], merge_dicts]
+    # section key -> hashes of the source chunks the draft was written from
+    section_sources: Annotated[Dict[str, List[str]], merge_dicts]
     final_tutorial: str
     html_content: str
+    artifacts: Dict[str, str]  # export format -> file name under /tutorial
     error_message: str
     current_section_key: str
+    # section key -> failed attempts, for sections that have no draft yet
+    section_failures: Annotated[Dict[str, int], merge_dicts]
     enhanced_sections: Dict[str, str]
     code_examples: Dict[str, List[str]]
     concept_explanations: Dict[str, str]
 
+# Schema for SECTION_MODE=structured responses
+class KeyConcept(BaseModel):
+    name: str = Field(min_length=1)
+    explanation: str = Field(min_length=1)
+
+class CodeExample(BaseModel):
+    description: str = ""
+    language: str = ""
+    code: str = Field(min_length=1)
+
+class Exercise(BaseModel):
+    problem: str = Field(min_length=1)
+    hint: str = ""
+    expected_outcome: str = ""
+
+class StructuredSection(BaseModel):
+    body: str = Field(min_length=200)
+    key_concepts: List[KeyConcept] = []
+    examples: List[CodeExample] = []
+    exercises: List[Exercise] = []
+
 # --- ENHANCED AGENT NODES ---
 
 def extract_json_from_response(response: str) -> str:
@@ -170,14 +540,151 @@ def extract_json_from_response(response: str) -> str:
     
     return response.strip()
 
-def generate_outline(state: GraphState) -> GraphState:
+def read_corpus(state: GraphState, max_tokens: int) -> str:
+    """The start of the crawled corpus, at most max_tokens long, read lazily from corpus_store."""
+    ref = state.get("corpus_ref", "")
+    if not corpus_store.exists(ref):
+        print(f"⚠️  Corpus {ref[:12] or '(none)'} not found in the corpus store")
+        return ""
+    # Decompress only as much as the token budget can possibly use
+    text = corpus_store.read_text(ref, max_chars=max_tokens * MAX_CHARS_PER_TOKEN)
+    return truncate_to_tokens(text, max_tokens, llm.model_name)
+
+def llm_options(config: Optional[RunnableConfig], node: str, section: str = "") -> Dict:
+    """Per-run keyword arguments for llm.invoke: usage tracking and the scheduler session."""
+    configurable = (config or {}).get("configurable", {})
+    return {
+        "usage": configurable.get("usage"),
+        "session": configurable.get("session_id", ""),
+        "node": node,
+        "section": section
+    }
+
+def summarize_text(prompt: str, fallback: str, options: Dict) -> str:
+    """One map/reduce call; on failure the (already budgeted) input stands in for its summary."""
+    try:
+        summary = llm.invoke(prompt, **options)
+        if summary.strip():
+            return summary.strip()
+    except Exception as e:
+        print(f"⚠️  Summary call failed, keeping an excerpt instead: {str(e)[:100]}")
+    return truncate_to_tokens(fallback, SUMMARY_TOKENS, llm.model_name)
+
+def summarize_batches(batches, make_prompt: Callable[[str], str], options: Dict) -> List[str]:
+    """Summarize each text from an iterable concurrently, keeping at most SUMMARY_WORKERS * 2
+    in flight so a huge corpus is never held in memory all at once. Results keep input order."""
+    window = SUMMARY_WORKERS * 2
+    results: Dict[int, str] = {}
+    pending: Dict[concurrent.futures.Future, int] = {}
+    for index, text in enumerate(batches):
+        if len(pending) >= window:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                results[pending.pop(future)] = future.result()
+        pending[_summary_executor.submit(summarize_text, make_prompt(text), text, options)] = index
+    for future in concurrent.futures.as_completed(pending):
+        results[pending[future]] = future.result()
+    return [results[i] for i in range(len(results))]
+
+def corpus_page_groups(state: GraphState, max_tokens: int):
+    """Yield the corpus as consecutive groups of whole pages, each at most max_tokens."""
+    group: List[str] = []
+    group_tokens = 0
+    for page in corpus_store.iter_pages(state["corpus_ref"]):
+        text = truncate_to_tokens(format_page(page), max_tokens, llm.model_name)
+        tokens = count_tokens(text, llm.model_name)
+        if group and group_tokens + tokens > max_tokens:
+            yield PAGE_SEPARATOR.join(group)
+            group, group_tokens = [], 0
+        group.append(text)
+        group_tokens += tokens
+    if group:
+        yield PAGE_SEPARATOR.join(group)
+
+def corpus_fits(state: GraphState, max_tokens: int) -> bool:
+    """Whether the whole corpus fits in max_tokens, reading no further than needed to tell."""
+    total = 0
+    for page in corpus_store.iter_pages(state["corpus_ref"]):
+        total += count_tokens(format_page(page), llm.model_name)
+        if total > max_tokens:
+            return False
+    return True
+
+def summarize_corpus(state: GraphState, config: Optional[RunnableConfig] = None) -> Dict:
+    """Map-reduce the corpus into a digest that fits the outline prompt.
+
+    Page groups are summarized concurrently (map), then the summaries are merged
+    in batches, level by level, until they fit (reduce). Latency grows with the
+    depth of that tree, not with the number of pages. Corpora that already fit
+    the outline budget are passed through untouched.
+    """
+    print("---AGENT: Summarizing Corpus---")
+    digest_tokens = prompt_budget(llm.model_name, OUTLINE_CONTEXT_TOKENS, PROMPT_OVERHEAD_TOKENS)
+    if not corpus_store.exists(state.get("corpus_ref", "")) or corpus_fits(state, digest_tokens):
+        return {"corpus_digest": ""}
+    
+    options = llm_options(config, "summarize_corpus")
+    input_tokens = prompt_budget(llm.model_name, SUMMARY_INPUT_TOKENS, PROMPT_OVERHEAD_TOKENS)
+    summaries = summarize_batches(
+        corpus_page_groups(state, input_tokens),
+        lambda text: f"""Summarize this documentation excerpt for someone planning a complete tutorial about it.
+List every topic, feature, API, concept, configuration option and setup step it covers, and keep the source URLs.
+Be dense and factual, at most {SUMMARY_TOKENS * 3 // 4} words.
+
+Documentation:
+---
+{text}
+---""",
+        options
+    )
+    emit_event(config, {"type": "status", "agent": "structure", "status": "working", "progress": 15,
+                        "message": f"Summarized {len(summaries)} page groups"})
+    
+    level = 0
+    while len(summaries) > 1 and sum(count_tokens(s, llm.model_name) for s in summaries) > digest_tokens:
+        level += 1
+        batches: List[str] = []
+        batch: List[str] = []
+        batch_tokens = 0
+        for summary in summaries:
+            tokens = count_tokens(summary, llm.model_name)
+            if batch and batch_tokens + tokens > input_tokens:
+                batches.append(PAGE_SEPARATOR.join(batch))
+                batch, batch_tokens = [], 0
+            batch.append(summary)
+            batch_tokens += tokens
+        batches.append(PAGE_SEPARATOR.join(batch))
+        if len(batches) == len(summaries):
+            # Summaries too long to pair up; merging further would not shrink them
+            break
+        summaries = summarize_batches(
+            batches,
+            lambda text: f"""These are summaries of consecutive parts of the same documentation.
+Merge them into one summary for planning a complete tutorial. Keep every distinct topic, feature, API and
+setup step, drop repetition, and keep the most important source URLs. At most {SUMMARY_TOKENS * 3 // 4} words.
+
+Summaries:
+---
+{text}
+---""",
+            options
+        )
+        print(f"📚 Reduce level {level}: {len(summaries)} summaries")
+    
+    digest = truncate_to_tokens(PAGE_SEPARATOR.join(summaries), digest_tokens, llm.model_name)
+    return {"corpus_digest": digest}
+
+def generate_outline(state: GraphState, config: Optional[RunnableConfig] = None) -> Dict:
     """Generates a comprehensive, structured outline for the tutorial."""
     print("---AGENT: Generating Enhanced Outline---")
+    context_tokens = prompt_budget(llm.model_name, OUTLINE_CONTEXT_TOKENS, PROMPT_OVERHEAD_TOKENS)
+    # Large corpora arrive pre-summarized by summarize_corpus
+    documentation = state.get("corpus_digest") or read_corpus(state, context_tokens)
     prompt = f"""Based on the following documentation content, create a comprehensive, beginner-friendly tutorial outline that covers ALL important concepts without leaving anything behind.
 
 Documentation Content:
 ---
-{state['scraped_content'][:25000]}
+{documentation}
 ---
 User's original request: {state['original_query']}
 
@@ -238,55 +745,125 @@ IMPORTANT:
 Respond with ONLY the JSON object:"""
 
     try:
-        outline_str = llm.invoke(prompt)
-        print(f"Raw LLM response: {outline_str[:200]}...")
-        
-        json_str = extract_json_from_response(outline_str)
-        print(f"Extracted JSON: {json_str[:200]}...")
-        
-        outline = json.loads(json_str)
+        outline = None
+        attempt_prompt = prompt
+        for attempt in range(1, OUTLINE_MAX_ATTEMPTS + 1):
+            try:
+                outline_str = llm.invoke(attempt_prompt, **llm_options(config, "generate_outline"))
+                print(f"Raw LLM response: {outline_str[:200]}...")
+                
+                json_str = extract_json_from_response(outline_str)
+                print(f"Extracted JSON: {json_str[:200]}...")
+                
+                outline = json.loads(json_str)
+                if not outline.get("sections"):
+                    raise ValueError("Outline has no sections")
+                break
+            except LLMError:
+                # The wrapper has already retried transient errors
+                if attempt == OUTLINE_MAX_ATTEMPTS:
+                    raise
+                print(f"⚠️  Outline attempt {attempt} failed, trying again")
+            except (ValueError, AttributeError) as e:
+                if attempt == OUTLINE_MAX_ATTEMPTS:
+                    raise
+                print(f"⚠️  Outline attempt {attempt} was not a valid outline ({e}), asking again")
+                # A different prompt also avoids replaying the same bad answer from the cache
+                attempt_prompt = prompt + "\n\nYour previous answer was not a valid JSON outline. Respond with ONLY the JSON object, with a non-empty \"sections\" list."
         
         return {
-            "original_query": state["original_query"],
-            "scraped_content": state["scraped_content"],
             "tutorial_outline": outline,
-            "section_drafts": {},
-            "final_tutorial": "",
-            "html_content": "",
             "error_message": "",
-            "current_section_key": "0",
-            "enhanced_sections": {},
-            "code_examples": {},
-            "concept_explanations": {}
+            "current_section_key": "0"
         }
     except Exception as e:
         print(f"Outline generation error: {e}")
         return {
-            "original_query": state["original_query"],
-            "scraped_content": state["scraped_content"],
             "tutorial_outline": {},
-            "section_drafts": {},
-            "final_tutorial": "",
-            "html_content": "",
-            "error_message": f"Outline generation failed: {e}",
-            "current_section_key": "0",
-            "enhanced_sections": {},
-            "code_examples": {},
-            "concept_explanations": {}
+            "error_message": f"Outline generation failed: {e}"
         }
 
-def write_enhanced_section(state: GraphState) -> GraphState:
-    """Writes comprehensive, high-quality content for a single section."""
-    print(f"---AGENT: Writing Enhanced Section: {state['current_section_key']}---")
+def emit_event(config: Optional[RunnableConfig], message: Dict) -> None:
+    """Forward a progress message to the caller's `emit` callback, if one was configured."""
+    emit = (config or {}).get("configurable", {}).get("emit")
+    if not emit:
+        return
     try:
-        section_info = state['tutorial_outline']['sections'][int(state['current_section_key'])]
+        emit(message)
+    except Exception as e:
+        print(f"⚠️  Could not forward {message.get('type')} event: {e}")
+
+def build_section_context(state: GraphState, section_info: Dict,
+                          config: Optional[RunnableConfig] = None) -> Tuple[str, List[str]]:
+    """Retrieve the documentation chunks most relevant to a section, trimmed to SECTION_CONTEXT_TOKENS.
+
+    Falls back to the start of the scraped corpus when no vector store is configured
+    or the search returns nothing. Also returns the hashes of the chunks used,
+    which decide whether the section needs rewriting after a recrawl.
+    """
+    budget_tokens = prompt_budget(llm.model_name, SECTION_CONTEXT_TOKENS, PROMPT_OVERHEAD_TOKENS)
+    vector_store = (config or {}).get("configurable", {}).get("vector_store")
+    corpus_id = state.get("corpus_id")
+    
+    if vector_store is not None and corpus_id:
+        query = f"{section_info['title']}\n{section_info.get('brief_description', '')}"
+        hits = vector_store.search(query, limit=SECTION_CONTEXT_CHUNKS, corpus_id=corpus_id)
+        
+        parts = []
+        sources = []
+        used_tokens = 0
+        seen_chunks = set()
+        for hit in hits:
+            chunk_hash = hit.get("chunk_hash") or hashlib.sha256(hit.get("text", "").encode("utf-8")).hexdigest()
+            if chunk_hash in seen_chunks:
+                continue
+            seen_chunks.add(chunk_hash)
+            source_url = hit.get("metadata", {}).get("source_url", "unknown")
+            part = f"Source URL: {source_url}\n\n{hit.get('text', '')}"
+            part_tokens = count_tokens(part, llm.model_name)
+            if used_tokens + part_tokens > budget_tokens:
+                break
+            parts.append(part)
+            sources.append(chunk_hash)
+            used_tokens += part_tokens
         
-        # Generate comprehensive content
-        main_prompt = f"""You are an expert technical writer creating a comprehensive tutorial section.
+        if parts:
+            return PAGE_SEPARATOR.join(parts), sources
+        print(f"⚠️  No retrieved context for '{section_info['title']}', using the start of the corpus")
+    
+    context = read_corpus(state, budget_tokens)
+    return context, ["prefix:" + hashlib.sha256(context.encode("utf-8")).hexdigest()]
+
+def run_enrichment_prompts(prompts: Dict[str, str], options: Optional[Dict] = None) -> Dict[str, str]:
+    """Run independent enrichment prompts concurrently, each bounded by ENRICHMENT_TIMEOUT.
+
+    The limit is enforced inside each call and starts when its request is
+    admitted, so time spent queued behind other sections does not count.
+    A prompt that fails or times out yields an empty string so the section
+    is still published with whatever enrichment did finish.
+    """
+    options = options or {}
+    futures = {
+        name: _enrichment_executor.submit(llm.invoke, prompt, timeout=ENRICHMENT_TIMEOUT, **options)
+        for name, prompt in prompts.items()
+    }
+    results, dropped = {}, []
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            dropped.append(f"{name}: {' '.join(str(e).split())[:80]}")
+            results[name] = ""
+    if dropped:
+        print(f"⚠️  Section {options.get('section', '?')}: dropped {len(dropped)} of {len(prompts)} enrichments ({'; '.join(dropped)})")
+    return results
+
+def section_prompt_header(state: GraphState, section_info: Dict, documentation_context: str) -> str:
+    return f"""You are an expert technical writer creating a comprehensive tutorial section.
 Your task is to write detailed, clear, and engaging content that leaves no concept unexplained.
 
 CONTEXT:
-Full Documentation: {state['scraped_content'][:20000]}
+Relevant Documentation: {documentation_context}
 Tutorial Title: {state['tutorial_outline'].get('title', 'Tutorial')}
 All Sections: {json.dumps([s['title'] for s in state['tutorial_outline'].get('sections', [])], indent=2)}
 
@@ -317,29 +894,42 @@ FORMATTING GUIDELINES:
 - Use > for important notes or tips
 - Use numbered lists for procedures
 - Use bullet points for features/concepts
+"""
 
+def write_section_multi_call(state: GraphState, section_key: str, section_info: Dict,
+                             documentation_context: str, config: Optional[RunnableConfig] = None) -> str:
+    """Stream the draft, then extract concepts, examples and exercises from it in three concurrent calls."""
+    main_prompt = section_prompt_header(state, section_info, documentation_context) + """
 Write comprehensive, detailed content for this section (aim for 800-1500 words):"""
 
-        section_content = llm.invoke(main_prompt)
-        
-        # Enhance with key concepts
-        concepts_prompt = f"""Extract the 3-5 most important concepts from this section and provide clear explanations:
+    def forward_delta(delta: str) -> None:
+        emit_event(config, {
+            "type": "section_delta",
+            "section_key": section_key,
+            "title": section_info['title'],
+            "delta": delta
+        })
+
+    section_content = llm.invoke(main_prompt, on_token=forward_delta,
+                                 **llm_options(config, "write_section", section_key))
+    draft_excerpt = truncate_to_tokens(section_content, DRAFT_EXCERPT_TOKENS, llm.model_name)
+    exercise_excerpt = truncate_to_tokens(section_content, EXERCISE_EXCERPT_TOKENS, llm.model_name)
+    
+    # Enrichment prompts only depend on the draft, so run them concurrently
+    concepts_prompt = f"""Extract the 3-5 most important concepts from this section and provide clear explanations:
 
 Section: {section_info['title']}
-Content: {section_content[:5000]}
+Content: {draft_excerpt}
 
 For each concept, provide a clear, beginner-friendly explanation. Format as:
 **Concept Name**: Clear explanation of what this is and why it matters.
 
 Focus on the most essential concepts that beginners need to understand."""
 
-        concepts_content = llm.invoke(concepts_prompt)
-        
-        # Generate practical examples
-        examples_prompt = f"""Create 2-3 practical, working code examples for this section:
+    examples_prompt = f"""Create 2-3 practical, working code examples for this section:
 
 Section: {section_info['title']}
-Content: {section_content[:5000]}
+Content: {draft_excerpt}
 
 Each example should:
 1. Be complete and runnable
@@ -353,22 +943,10 @@ Format each as:
 code here
 ```"""
 
-        examples_content = llm.invoke(examples_prompt)
-        
-        # Combine all content
-        enhanced_content = section_content
-        
-        if concepts_content and "**" in concepts_content:
-            enhanced_content += f"\n\n### 🔑 Key Concepts\n\n{concepts_content}"
-        
-        if examples_content and "```" in examples_content:
-            enhanced_content += f"\n\n### 💻 Practical Examples\n\n{examples_content}"
-        
-        # Add practice exercises
-        exercise_prompt = f"""Create 1-2 simple practice exercises for this section:
+    exercise_prompt = f"""Create 1-2 simple practice exercises for this section:
 
 Section: {section_info['title']}
-Content: {section_content[:3000]}
+Content: {exercise_excerpt}
 
 Each exercise should:
 1. Be achievable by beginners
@@ -380,48 +958,130 @@ Format as:
 *Hint*: Helpful guidance
 *Expected outcome*: What they should achieve"""
 
-        exercise_content = llm.invoke(exercise_prompt)
+    enrichments = run_enrichment_prompts(
+        {"concepts": concepts_prompt, "examples": examples_prompt, "exercises": exercise_prompt},
+        llm_options(config, "enrich_section", section_key)
+    )
+    concepts_content, examples_content, exercise_content = (
+        enrichments["concepts"], enrichments["examples"], enrichments["exercises"]
+    )
+    
+    # Combine all content
+    enhanced_content = section_content
+    
+    if concepts_content and "**" in concepts_content:
+        enhanced_content += f"\n\n### 🔑 Key Concepts\n\n{concepts_content}"
+    
+    if examples_content and "```" in examples_content:
+        enhanced_content += f"\n\n### 💻 Practical Examples\n\n{examples_content}"
+    
+    if exercise_content and "Exercise" in exercise_content:
+        enhanced_content += f"\n\n### 🎯 Practice Exercises\n\n{exercise_content}"
+    
+    return enhanced_content
+
+def render_structured_section(section: StructuredSection) -> str:
+    """Render a structured section as the same markdown the multi-call path produces."""
+    content = section.body.strip()
+    if section.key_concepts:
+        concepts = "\n\n".join(f"**{c.name}**: {c.explanation}" for c in section.key_concepts)
+        content += f"\n\n### 🔑 Key Concepts\n\n{concepts}"
+    if section.examples:
+        examples = "\n\n".join(
+            f"```{e.language}\n// Example: {e.description}\n{e.code.strip()}\n```" for e in section.examples
+        )
+        content += f"\n\n### 💻 Practical Examples\n\n{examples}"
+    if section.exercises:
+        exercises = []
+        for i, exercise in enumerate(section.exercises, 1):
+            text = f"**Exercise {i}**: {exercise.problem}"
+            if exercise.hint:
+                text += f"\n*Hint*: {exercise.hint}"
+            if exercise.expected_outcome:
+                text += f"\n*Expected outcome*: {exercise.expected_outcome}"
+            exercises.append(text)
+        content += "\n\n### 🎯 Practice Exercises\n\n" + "\n\n".join(exercises)
+    return content
+
+def write_section_structured(state: GraphState, section_key: str, section_info: Dict,
+                             documentation_context: str, config: Optional[RunnableConfig] = None) -> Optional[str]:
+    """Generate body, concepts, examples and exercises in one JSON-mode call.
+
+    Returns None when the call fails (e.g. a provider rejects response_format,
+    or replay mode has no recording of it) or the response is not valid
+    against StructuredSection, so the caller can fall back to the multi-call path.
+    """
+    prompt = section_prompt_header(state, section_info, documentation_context) + """
+Respond with ONLY a JSON object with this exact structure:
+{
+  "body": "The full section in markdown (aim for 800-1500 words)",
+  "key_concepts": [
+    {"name": "Concept Name", "explanation": "Clear explanation of what this is and why it matters"}
+  ],
+  "examples": [
+    {"description": "Brief description", "language": "python", "code": "complete, runnable, commented code"}
+  ],
+  "exercises": [
+    {"problem": "Clear problem description", "hint": "Helpful guidance", "expected_outcome": "What they should achieve"}
+  ]
+}
+
+Include 3-5 key concepts, 2-3 practical examples and 1-2 beginner-friendly exercises."""
+
+    try:
+        response = llm.invoke(prompt, json_mode=True, **llm_options(config, "write_section_structured", section_key))
+    except (LLMError, CacheMissError) as e:
+        print(f"⚠️  Structured section {section_key} call failed ({' '.join(str(e).split())[:120]}), falling back to multi-call")
+        return None
+    try:
+        section = StructuredSection.model_validate_json(extract_json_from_response(response))
+    except (ValidationError, ValueError) as e:
+        print(f"⚠️  Structured section {section_key} invalid ({' '.join(str(e).split())[:120]}), falling back to multi-call")
+        return None
+    
+    content = render_structured_section(section)
+    # Nothing streams in JSON mode, so publish the finished section as one delta
+    emit_event(config, {
+        "type": "section_delta",
+        "section_key": section_key,
+        "title": section_info['title'],
+        "delta": content
+    })
+    return content
+
+def write_enhanced_section(state: GraphState, config: Optional[RunnableConfig] = None) -> Dict:
+    """Writes comprehensive, high-quality content for a single section.
+
+    In the default multi-call mode the main draft is streamed to the caller as
+    `section_delta` events. With SECTION_MODE=structured the whole section is
+    requested as one JSON object, falling back to multi-call if it does not validate.
+    """
+    section_key = state['current_section_key']
+    print(f"---AGENT: Writing Enhanced Section: {section_key}---")
+    try:
+        section_info = state['tutorial_outline']['sections'][int(section_key)]
+        documentation_context, sources = build_section_context(state, section_info, config)
+        section_mode = (config or {}).get("configurable", {}).get("section_mode", SECTION_MODE)
         
-        if exercise_content and "Exercise" in exercise_content:
-            enhanced_content += f"\n\n### 🎯 Practice Exercises\n\n{exercise_content}"
+        enhanced_content = None
+        if section_mode == "structured":
+            enhanced_content = write_section_structured(state, section_key, section_info, documentation_context, config)
+        if enhanced_content is None:
+            enhanced_content = write_section_multi_call(state, section_key, section_info, documentation_context, config)
         
         # Final enhancement pass
         enhanced_content = enhance_section_content(enhanced_content, section_info['title'])
         
-        current_drafts = dict(state['section_drafts'])
-        current_drafts[state['current_section_key']] = enhanced_content
-        
-        return {
-            "original_query": state["original_query"],
-            "scraped_content": state["scraped_content"],
-            "tutorial_outline": state["tutorial_outline"],
-            "section_drafts": current_drafts,
-            "final_tutorial": state["final_tutorial"],
-            "html_content": state.get("html_content", ""),
-            "error_message": state["error_message"],
-            "current_section_key": state["current_section_key"],
-            "enhanced_sections": state.get("enhanced_sections", {}),
-            "code_examples": state.get("code_examples", {}),
-            "concept_explanations": state.get("concept_explanations", {})
-        }
+        # Only this section's draft; the reducer merges it into section_drafts
+        return {"section_drafts": {section_key: enhanced_content}, "section_sources": {section_key: sources}}
     except Exception as e:
-        print(f"Section writing error: {e}")
-        current_drafts = dict(state['section_drafts'])
-        current_drafts[state['current_section_key']] = f"Error generating section content: {e}"
+        # Leave the section without a draft so it is retried on its own later
+        attempts = state.get("section_failures", {}).get(section_key, 0) + 1
+        print(f"Section writing error (attempt {attempts}/{SECTION_MAX_ATTEMPTS}): {e}")
+        # Discard whatever was streamed before the failure
+        emit_event(config, {"type": "section_reset", "section_key": section_key})
         
-        return {
-            "original_query": state["original_query"],
-            "scraped_content": state["scraped_content"],
-            "tutorial_outline": state["tutorial_outline"],
-            "section_drafts": current_drafts,
-            "final_tutorial": state["final_tutorial"],
-            "html_content": state.get("html_content", ""),
-            "error_message": state["error_message"],
-            "current_section_key": state["current_section_key"],
-            "enhanced_sections": state.get("enhanced_sections", {}),
-            "code_examples": state.get("code_examples", {}),
-            "concept_explanations": state.get("concept_explanations", {})
-        }
+        return {"section_failures": {section_key: attempts}}
 
 def enhance_section_content(content: str, section_title: str) -> str:
     """Enhance section content with better formatting and structure."""
@@ -442,715 +1102,7 @@ def enhance_section_content(content: str, section_title: str) -> str:
     
     return content.strip()
 
-def create_beautiful_html(title: str, sections: list, metadata: dict) -> str:
-    """Create a beautiful, elegant HTML document with modern styling."""
-    
-    # Generate table of contents
-    toc_items = []
-    for i, section in enumerate(sections):
-        section_id = f"section-{i+1}"
-        section_title = section.get("title", "Section").replace("## ", "").replace("# ", "")
-        toc_items.append(f'<li><a href="#{section_id}" class="toc-link">{section_title}</a></li>')
-    
-    toc_html = f'<ul class="toc-list">{"".join(toc_items)}</ul>' if toc_items else ""
-    
-    # Generate sections HTML
-    sections_html = []
-    for i, section in enumerate(sections):
-        section_id = f"section-{i+1}"
-        section_title = section.get('title', 'Section').replace("## ", "").replace("# ", "")
-        section_content = section.get('content', '')
-        
-        # Convert markdown-like content to HTML
-        content_html = convert_markdown_to_html(section_content)
-        
-        sections_html.append(f'''
-        <section id="{section_id}" class="tutorial-section">
-            <h2 class="section-title">
-                <span class="section-number">{i+1}</span>
-                {section_title}
-            </h2>
-            <div class="section-content">
-                {content_html}
-            </div>
-        </section>
-        ''')
-    
-    # Create the complete HTML with enhanced styling
-    html_template = f'''<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{title}</title>
-    <style>
-        * {{
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }}
-        
-        body {{
-            font-family: 'Inter', 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            line-height: 1.8;
-            color: #2d3748;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-        }}
-        
-        .container {{
-            max-width: 1200px;
-            margin: 0 auto;
-            background: white;
-            box-shadow: 0 25px 80px rgba(0,0,0,0.15);
-            border-radius: 20px;
-            overflow: hidden;
-            margin-top: 2rem;
-            margin-bottom: 2rem;
-        }}
-        
-        .header {{
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            padding: 4rem 2rem;
-            text-align: center;
-            position: relative;
-            overflow: hidden;
-        }}
-        
-        .header::before {{
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            right: 0;
-            bottom: 0;
-            background: url('data:image/svg+xml,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100"><defs><pattern id="grain" width="100" height="100" patternUnits="userSpaceOnUse"><circle cx="25" cy="25" r="1" fill="white" opacity="0.1"/><circle cx="75" cy="75" r="1" fill="white" opacity="0.1"/><circle cx="50" cy="10" r="0.5" fill="white" opacity="0.1"/></pattern></defs><rect width="100" height="100" fill="url(%23grain)"/></svg>');
-        }}
-        
-        .main-title {{
-            font-size: 3rem;
-            font-weight: 800;
-            margin-bottom: 1rem;
-            text-shadow: 2px 2px 4px rgba(0,0,0,0.3);
-            position: relative;
-            z-index: 1;
-            letter-spacing: -0.02em;
-        }}
-        
-        .subtitle {{
-            font-size: 1.3rem;
-            opacity: 0.9;
-            font-weight: 300;
-            position: relative;
-            z-index: 1;
-            max-width: 600px;
-            margin: 0 auto;
-        }}
-        
-        .metadata {{
-            background: linear-gradient(135deg, #f8f9fa 0%, #e9ecef 100%);
-            padding: 2rem;
-            border-left: 5px solid #667eea;
-            margin: 0;
-            font-size: 1rem;
-            color: #495057;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            flex-wrap: wrap;
-        }}
-        
-        .metadata-item {{
-            display: flex;
-            align-items: center;
-            margin: 0.5rem 0;
-        }}
-        
-        .metadata-icon {{
-            margin-right: 0.5rem;
-            font-size: 1.2rem;
-        }}
-        
-        .content {{
-            padding: 3rem 2rem;
-        }}
-        
-        .toc {{
-            background: linear-gradient(135deg, #f8f9fa 0%, #e9ecef 100%);
-            border-radius: 20px;
-            padding: 2.5rem;
-            margin-bottom: 4rem;
-            border: 1px solid #dee2e6;
-            box-shadow: 0 10px 30px rgba(0,0,0,0.05);
-        }}
-        
-        .toc h3 {{
-            color: #495057;
-            margin-bottom: 1.5rem;
-            font-size: 1.5rem;
-            display: flex;
-            align-items: center;
-            font-weight: 700;
-        }}
-        
-        .toc h3::before {{
-            content: "📚";
-            margin-right: 0.75rem;
-            font-size: 1.8rem;
-        }}
-        
-        .toc-list {{
-            list-style: none;
-            padding: 0;
-        }}
-        
-        .toc-list li {{
-            margin: 0.75rem 0;
-        }}
-        
-        .toc-link {{
-            color: #495057;
-            text-decoration: none;
-            padding: 1rem 1.5rem;
-            border-radius: 12px;
-            display: block;
-            transition: all 0.3s ease;
-            border-left: 4px solid transparent;
-            font-weight: 500;
-            position: relative;
-            overflow: hidden;
-        }}
-        
-        .toc-link::before {{
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            width: 0;
-            height: 100%;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            transition: width 0.3s ease;
-            z-index: -1;
-        }}
-        
-        .toc-link:hover {{
-            color: white;
-            border-left-color: #667eea;
-            transform: translateX(8px);
-            box-shadow: 0 5px 20px rgba(102, 126, 234, 0.2);
-        }}
-        
-        .toc-link:hover::before {{
-            width: 100%;
-        }}
-        
-        .tutorial-section {{
-            margin-bottom: 5rem;
-            scroll-margin-top: 2rem;
-            position: relative;
-        }}
-        
-        .section-title {{
-            color: #2d3748;
-            font-size: 2.2rem;
-            margin-bottom: 2rem;
-            padding-bottom: 1rem;
-            border-bottom: 3px solid #667eea;
-            display: flex;
-            align-items: center;
-            font-weight: 700;
-            letter-spacing: -0.02em;
-        }}
-        
-        .section-number {{
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            width: 3rem;
-            height: 3rem;
-            border-radius: 50%;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            margin-right: 1.5rem;
-            font-weight: bold;
-            font-size: 1.2rem;
-            box-shadow: 0 5px 15px rgba(102, 126, 234, 0.3);
-        }}
-        
-        .section-content {{
-            font-size: 1.1rem;
-            line-height: 1.8;
-        }}
-        
-        .section-content p {{
-            margin-bottom: 1.5rem;
-            text-align: justify;
-        }}
-        
-        .section-content h3 {{
-            color: #4a5568;
-            margin: 2.5rem 0 1.5rem 0;
-            font-size: 1.5rem;
-            font-weight: 600;
-            border-left: 4px solid #667eea;
-            padding-left: 1rem;
-        }}
-        
-        .section-content h4 {{
-            color: #718096;
-            margin: 2rem 0 1rem 0;
-            font-size: 1.2rem;
-            font-weight: 600;
-        }}
-        
-        .code-block {{
-            background: linear-gradient(135deg, #2d3748 0%, #4a5568 100%);
-            border: 1px solid #4a5568;
-            border-radius: 15px;
-            margin: 2rem 0;
-            overflow: hidden;
-            box-shadow: 0 10px 30px rgba(0,0,0,0.1);
-            position: relative;
-        }}
-        
-        .code-block::before {{
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            right: 0;
-            height: 3px;
-            background: linear-gradient(90deg, #667eea, #764ba2, #667eea);
-        }}
-        
-        .code-block pre {{
-            padding: 2rem;
-            margin: 0;
-            overflow-x: auto;
-            color: #e2e8f0;
-            font-size: 0.95rem;
-        }}
-        
-        .code-block code {{
-            font-family: 'Fira Code', 'JetBrains Mono', 'Consolas', 'Monaco', monospace;
-            line-height: 1.6;
-        }}
-        
-        .inline-code {{
-            background: linear-gradient(135deg, #f1f3f4 0%, #e8eaed 100%);
-            color: #d63384;
-            padding: 0.3rem 0.6rem;
-            border-radius: 6px;
-            font-family: 'Fira Code', 'Consolas', 'Monaco', monospace;
-            font-size: 0.9em;
-            font-weight: 500;
-            border: 1px solid #dee2e6;
-        }}
-        
-        .section-content ul {{
-            margin: 1.5rem 0;
-            padding-left: 0;
-            list-style: none;
-        }}
-        
-        .section-content li {{
-            margin: 1rem 0;
-            padding-left: 2rem;
-            position: relative;
-            line-height: 1.6;
-        }}
-        
-        .section-content li::before {{
-            content: "▶";
-            color: #667eea;
-            position: absolute;
-            left: 0;
-            font-weight: bold;
-        }}
-        
-        .section-content ol {{
-            margin: 1.5rem 0;
-            padding-left: 2rem;
-        }}
-        
-        .section-content ol li {{
-            padding-left: 0.5rem;
-        }}
-        
-        .section-content ol li::before {{
-            display: none;
-        }}
-        
-        .section-content strong {{
-            color: #2d3748;
-            font-weight: 700;
-        }}
-        
-        .section-content em {{
-            color: #4a5568;
-            font-style: italic;
-        }}
-        
-        .note-box {{
-            background: linear-gradient(135deg, #e6fffa 0%, #b2f5ea 100%);
-            border-left: 5px solid #38b2ac;
-            padding: 1.5rem;
-            margin: 2rem 0;
-            border-radius: 0 10px 10px 0;
-            box-shadow: 0 5px 15px rgba(56, 178, 172, 0.1);
-        }}
-        
-        .note-box::before {{
-            content: "💡 ";
-            font-size: 1.2rem;
-            margin-right: 0.5rem;
-        }}
-        
-        .warning-box {{
-            background: linear-gradient(135deg, #fef5e7 0%, #fbd38d 100%);
-            border-left: 5px solid #ed8936;
-            padding: 1.5rem;
-            margin: 2rem 0;
-            border-radius: 0 10px 10px 0;
-            box-shadow: 0 5px 15px rgba(237, 137, 54, 0.1);
-        }}
-        
-        .warning-box::before {{
-            content: "⚠️ ";
-            font-size: 1.2rem;
-            margin-right: 0.5rem;
-        }}
-        
-        .footer {{
-            background: linear-gradient(135deg, #2d3748 0%, #4a5568 100%);
-            color: white;
-            text-align: center;
-            padding: 3rem 2rem;
-            margin-top: 4rem;
-        }}
-        
-        .footer p {{
-            margin: 0.5rem 0;
-            opacity: 0.9;
-        }}
-        
-        .footer-title {{
-            font-size: 1.2rem;
-            font-weight: 600;
-            margin-bottom: 1rem;
-        }}
-        
-        @media (max-width: 768px) {{
-            .container {{
-                margin: 1rem;
-                border-radius: 15px;
-            }}
-            
-            .header {{
-                padding: 2rem 1rem;
-            }}
-            
-            .main-title {{
-                font-size: 2.2rem;
-            }}
-            
-            .content {{
-                padding: 2rem 1.5rem;
-            }}
-            
-            .section-title {{
-                font-size: 1.8rem;
-                flex-direction: column;
-                align-items: flex-start;
-            }}
-            
-            .section-number {{
-                margin-bottom: 1rem;
-                margin-right: 0;
-            }}
-            
-            .metadata {{
-                flex-direction: column;
-                align-items: flex-start;
-            }}
-        }}
-        
-        @media print {{
-            body {{
-                background: white;
-            }}
-            
-            .container {{
-                box-shadow: none;
-                margin: 0;
-            }}
-            
-            .header {{
-                background: #667eea !important;
-                -webkit-print-color-adjust: exact;
-            }}
-            
-            .code-block {{
-                background: #f8f9fa !important;
-                color: #2d3748 !important;
-                border: 1px solid #dee2e6 !important;
-            }}
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <header class="header">
-            <h1 class="main-title">{title}</h1>
-            <p class="subtitle">A comprehensive, step-by-step guide to mastering every concept</p>
-        </header>
-        
-        <div class="metadata">
-            <div class="metadata-item">
-                <span class="metadata-icon">📅</span>
-                <strong>Generated:</strong> {metadata.get('generated_at', 'Unknown')}
-            </div>
-            <div class="metadata-item">
-                <span class="metadata-icon">🔗</span>
-                <strong>Source:</strong> {metadata.get('source_query', 'Unknown')}
-            </div>
-            <div class="metadata-item">
-                <span class="metadata-icon">📊</span>
-                <strong>Sections:</strong> {len(sections)}
-            </div>
-        </div>
-        
-        <div class="content">
-            <div class="toc">
-                <h3>Table of Contents</h3>
-                {toc_html}
-            </div>
-            
-            {"".join(sections_html)}
-        </div>
-        
-        <footer class="footer">
-            <div class="footer-title">✨ Generated by Document to Tutorial Builder ✨</div>
-            <p>Crafted with advanced AI for optimal learning experience</p>
-            <p>Every concept explained • No detail left behind • Ready to learn</p>
-        </footer>
-    </div>
-</body>
-</html>'''
-    
-    return html_template
-
-def convert_markdown_to_html(content: str) -> str:
-    """Convert markdown-like content to HTML with enhanced formatting."""
-    html_content = content
-    
-    # Convert code blocks with language detection
-    html_content = re.sub(
-        r'```(\w+)?\n(.*?)\n```',
-        lambda m: f'<div class="code-block"><pre><code>{m.group(2).replace("<", "&lt;").replace(">", "&gt;")}</code></pre></div>',
-        html_content,
-        flags=re.DOTALL
-    )
-    
-    # Convert inline code
-    html_content = re.sub(r'`([^`]+)`', r'<code class="inline-code">\1</code>', html_content)
-    
-    # Convert bold text
-    html_content = re.sub(r'\*\*([^*]+)\*\*', r'<strong>\1</strong>', html_content)
-    
-    # Convert italic text
-    html_content = re.sub(r'\*([^*]+)\*', r'<em>\1</em>', html_content)
-    
-    # Convert headers
-    html_content = re.sub(r'^### (.+)$', r'<h3>\1</h3>', html_content, flags=re.MULTILINE)
-    html_content = re.sub(r'^## (.+)$', r'<h2>\1</h2>', html_content, flags=re.MULTILINE)
-    html_content = re.sub(r'^# (.+)$', r'<h1>\1</h1>', html_content, flags=re.MULTILINE)
-    
-    # Convert notes and warnings
-    html_content = re.sub(r'^> (.+)$', r'<div class="note-box">\1</div>', html_content, flags=re.MULTILINE)
-    
-    # Convert lists
-    html_content = re.sub(r'^- (.+)$', r'<li>\1</li>', html_content, flags=re.MULTILINE)
-    html_content = re.sub(r'^(\d+)\. (.+)$', r'<li>\2</li>', html_content, flags=re.MULTILINE)
-    
-    # Wrap consecutive list items in ul tags
-    html_content = re.sub(r'(<li>.*?</li>)(?:\s*<li>.*?</li>)*', lambda m: f'<ul>{m.group(0)}</ul>', html_content, flags=re.DOTALL)
-    
-    # Convert line breaks to paragraphs
-    paragraphs = html_content.split('\n\n')
-    formatted_paragraphs = []
-    
-    for para in paragraphs:
-        para = para.strip()
-        if para and not para.startswith('<'):
-            para = f'<p>{para.replace(chr(10), "<br>")}</p>'
-        formatted_paragraphs.append(para)
-    
-    return '\n'.join(formatted_paragraphs)
-
-def save_premium_formats(title: str, sections: list, metadata: dict, safe_title: str, timestamp: str, output_dir: str):
-    """Save tutorial in 3 premium formats: HTML, PDF, DOCX."""
-    saved_files = []
-    
-    # 1. Create Beautiful HTML
-    try:
-        html_content = create_beautiful_html(title, sections, metadata)
-        
-        html_filename = f"{safe_title}_{timestamp}.html"
-        html_filepath = os.path.join(output_dir, html_filename)
-        with open(html_filepath, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        saved_files.append(("HTML", html_filepath, html_content))
-        print(f"✅ Beautiful HTML saved: {html_filepath}")
-    except Exception as e:
-        print(f"❌ Error saving HTML: {e}")
-        html_content = ""
-    
-    # 2. Create PDF with fallback
-    try:
-        pdf_filename = f"{safe_title}_{timestamp}.pdf"
-        pdf_filepath = os.path.join(output_dir, pdf_filename)
-        
-        # Try WeasyPrint first
-        try:
-            import weasyprint
-            
-            # Create PDF with better styling for print
-            pdf_html = html_content.replace(
-                'background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);',
-                'background: white;'
-            )
-            
-            weasyprint.HTML(string=pdf_html).write_pdf(pdf_filepath)
-            saved_files.append(("PDF", pdf_filepath, ""))
-            print(f"✅ Professional PDF saved: {pdf_filepath}")
-            
-        except Exception as weasy_error:
-            print(f"⚠️  WeasyPrint failed: {str(weasy_error)[:100]}...")
-            print("🔄 Using alternative PDF generation...")
-            
-            # Use ReportLab as fallback
-            from agents.pdf_fallback import create_pdf_with_reportlab
-            
-            if create_pdf_with_reportlab(title, sections, metadata, pdf_filepath):
-                saved_files.append(("PDF", pdf_filepath, ""))
-                print(f"✅ Alternative PDF saved: {pdf_filepath}")
-            else:
-                print(f"❌ PDF generation failed completely")
-                
-    except Exception as e:
-        print(f"❌ Error in PDF generation: {e}")
-    
-    # 3. Create DOCX
-    try:
-        from docx import Document
-        from docx.shared import Inches, Pt, RGBColor
-        from docx.enum.text import WD_ALIGN_PARAGRAPH
-        from docx.enum.style import WD_STYLE_TYPE
-        
-        doc = Document()
-        
-        # Set document margins
-        sections_doc = doc.sections
-        for section in sections_doc:
-            section.top_margin = Inches(1)
-            section.bottom_margin = Inches(1)
-            section.left_margin = Inches(1.2)
-            section.right_margin = Inches(1.2)
-        
-        # Add title with styling
-        title_para = doc.add_heading(title, 0)
-        title_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        title_run = title_para.runs[0]
-        title_run.font.size = Pt(24)
-        title_run.font.color.rgb = RGBColor(45, 55, 72)
-        
-        # Add subtitle
-        subtitle_para = doc.add_paragraph("A comprehensive, step-by-step guide to mastering every concept")
-        subtitle_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        subtitle_run = subtitle_para.runs[0]
-        subtitle_run.font.size = Pt(14)
-        subtitle_run.font.color.rgb = RGBColor(113, 128, 150)
-        subtitle_run.italic = True
-        
-        # Add metadata
-        metadata_para = doc.add_paragraph()
-        metadata_para.add_run(f"Generated: {metadata.get('generated_at', 'Unknown')}").italic = True
-        metadata_para.add_run("\n")
-        metadata_para.add_run(f"Source: {metadata.get('source_query', 'Unknown')}").italic = True
-        metadata_para.add_run("\n")
-        metadata_para.add_run(f"Sections: {len(sections)}").italic = True
-        metadata_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        
-        # Add separator
-        doc.add_paragraph("─" * 60).alignment = WD_ALIGN_PARAGRAPH.CENTER
-        
-        # Add table of contents
-        toc_para = doc.add_heading("Table of Contents", level=1)
-        toc_run = toc_para.runs[0]
-        toc_run.font.color.rgb = RGBColor(102, 126, 234)
-        
-        for i, section_data in enumerate(sections):
-            toc_item = doc.add_paragraph(f"{i+1}. {section_data.get('title', 'Section').replace('## ', '').replace('# ', '')}")
-            toc_item.style = 'List Number'
-        
-        doc.add_page_break()
-        
-        # Add sections with enhanced formatting
-        for i, section_data in enumerate(sections):
-            # Section heading
-            section_title = section_data.get('title', 'Section').replace('## ', '').replace('# ', '')
-            section_heading = doc.add_heading(f"{i+1}. {section_title}", level=1)
-            heading_run = section_heading.runs[0]
-            heading_run.font.color.rgb = RGBColor(102, 126, 234)
-            
-            # Section content
-            content = section_data.get('content', '')
-            
-            # Process content with better formatting
-            paragraphs = content.split('\n\n')
-            
-            for para in paragraphs:
-                if para.strip():
-                    # Handle code blocks
-                    if para.strip().startswith('```'):
-                        code_content = re.sub(r'```.*?\n(.*?)\n```', r'\1', para, flags=re.DOTALL)
-                        code_para = doc.add_paragraph(code_content)
-                        code_para.style = 'Intense Quote'
-                        # Style code paragraph
-                        for run in code_para.runs:
-                            run.font.name = 'Consolas'
-                            run.font.size = Pt(10)
-                    else:
-                        # Clean up markdown formatting
-                        para_clean = re.sub(r'\*\*([^*]+)\*\*', r'\1', para)  # Remove bold
-                        para_clean = re.sub(r'\*([^*]+)\*', r'\1', para_clean)  # Remove italic
-                        para_clean = re.sub(r'`([^`]+)`', r'\1', para_clean)  # Remove inline code
-                        para_clean = re.sub(r'#{1,6}\s*', '', para_clean)  # Remove headers
-                        para_clean = re.sub(r'^- ', '• ', para_clean, flags=re.MULTILINE)  # Convert bullets
-                        
-                        if para_clean.strip():
-                            new_para = doc.add_paragraph(para_clean.strip())
-                            # Add spacing
-                            new_para.paragraph_format.space_after = Pt(6)
-            
-            # Add spacing between sections
-            doc.add_paragraph()
-        
-        # Save DOCX
-        docx_filename = f"{safe_title}_{timestamp}.docx"
-        docx_filepath = os.path.join(output_dir, docx_filename)
-        doc.save(docx_filepath)
-        saved_files.append(("DOCX", docx_filepath, ""))
-        print(f"✅ Professional DOCX saved: {docx_filepath}")
-        
-    except Exception as e:
-        print(f"❌ Error saving DOCX: {e}")
-    
-    return saved_files
-
-def compile_tutorial(state: GraphState) -> GraphState:
+def compile_tutorial(state: GraphState) -> Dict:
     """Compiles all written sections into a final tutorial document and saves in premium formats only."""
     print("---AGENT: Compiling Final Tutorial---")
     outline = state['tutorial_outline']
@@ -1180,17 +1132,17 @@ def compile_tutorial(state: GraphState) -> GraphState:
             {
                 "title": section.get('title', 'Section'),
                 "brief_description": section.get('brief_description', ''),
-                "content": drafts.get(str(i), "Error: Content for this section was not generated.")
+                "content": drafts.get(str(i), failed_section_notice(section.get('title', 'Section')))
             }
             for i, section in enumerate(outline.get('sections', []))
         ]
         
-        # Save in premium formats only
-        saved_files = save_premium_formats(title, sections, metadata, safe_title, timestamp, output_dir)
+        # The HTML page is saved now; PDF, DOCX and Markdown render when first requested
+        saved_files, artifacts = save_premium_formats(title, sections, metadata, safe_title, timestamp, output_dir)
         
-        print(f"\n🎉 Tutorial '{title}' saved in {len(saved_files)} premium formats:")
-        for format_name, filepath, html_content in saved_files:
-            print(f"   📄 {format_name}: {os.path.basename(filepath)}")
+        print(f"\n🎉 Tutorial '{title}' available as {', '.join(artifacts)}:")
+        for format_name, filename in artifacts.items():
+            print(f"   📄 {format_name}: {filename}")
         
         # Store HTML content for frontend display
         html_content_for_frontend = ""
@@ -1200,97 +1152,120 @@ def compile_tutorial(state: GraphState) -> GraphState:
                 break
         
         # Generate final markdown for compatibility
-        final_md = f"# {title}\n\n"
-        final_md += f"*Generated on: {metadata['generated_at']}*\n\n"
-        final_md += f"*Source: {metadata['source_query']}*\n\n"
-        final_md += "---\n\n"
-        
-        for i, section in enumerate(sections):
-            final_md += f"## {i+1}. {section.get('title', 'Section')}\n\n"
-            final_md += section.get('content', '') + "\n\n"
+        final_md = tutorial_markdown(title, sections, metadata)
         
         return {
-            "original_query": state.get("original_query", ""),
-            "scraped_content": state.get("scraped_content", ""),
-            "tutorial_outline": state.get("tutorial_outline", {}),
-            "section_drafts": state.get("section_drafts", {}),
             "final_tutorial": final_md,
             "html_content": html_content_for_frontend,  # Add HTML for frontend
-            "error_message": state.get("error_message", ""),
-            "current_section_key": state.get("current_section_key", ""),
-            "enhanced_sections": state.get("enhanced_sections", {}),
-            "code_examples": state.get("code_examples", {}),
-            "concept_explanations": state.get("concept_explanations", {})
+            "artifacts": artifacts
         }
         
     except Exception as e:
         print(f"❌ Error saving tutorial: {e}")
         return {
-            "original_query": state.get("original_query", ""),
-            "scraped_content": state.get("scraped_content", ""),
-            "tutorial_outline": state.get("tutorial_outline", {}),
-            "section_drafts": state.get("section_drafts", {}),
             "final_tutorial": "",
             "html_content": "",
-            "error_message": f"Tutorial compilation failed: {e}",
-            "current_section_key": state.get("current_section_key", ""),
-            "enhanced_sections": state.get("enhanced_sections", {}),
-            "code_examples": state.get("code_examples", {}),
-            "concept_explanations": state.get("concept_explanations", {})
+            "error_message": f"Tutorial compilation failed: {e}"
         }
 
+def failed_section_notice(title: str) -> str:
+    """Stands in for a section that still failed after SECTION_MAX_ATTEMPTS."""
+    return (f"> ⚠️ **{title}** could not be generated after {SECTION_MAX_ATTEMPTS} attempts. "
+            "The rest of the tutorial is complete; regenerate it to fill in this section.")
+
+def next_section_key(state: GraphState) -> Optional[str]:
+    """The next section to write: untried sections first, then failed ones with attempts left."""
+    sections = state.get('tutorial_outline', {}).get('sections', [])
+    drafts = state.get('section_drafts', {})
+    failures = state.get('section_failures', {})
+    pending = [str(i) for i in range(len(sections)) if str(i) not in drafts]
+    untried = [key for key in pending if key not in failures]
+    if untried:
+        return untried[0]
+    retryable = [key for key in pending if failures[key] < SECTION_MAX_ATTEMPTS]
+    return retryable[0] if retryable else None
+
 def should_continue(state: GraphState) -> str:
     """Determine whether to continue writing sections or compile the tutorial."""
     if state.get("error_message"):
         return "compile_tutorial"
-    
-    outline = state.get('tutorial_outline', {})
-    sections = outline.get('sections', [])
-    drafts = state.get('section_drafts', {})
-    current_section_key = int(state.get('current_section_key', '0'))
-    
-    # Check if we have written all sections
-    if len(drafts) >= len(sections):
-        return "compile_tutorial"
-    
-    # Check if current section key is beyond available sections
-    if current_section_key >= len(sections):
+    if next_section_key(state) is None:
         return "compile_tutorial"
-    
     return "write_section"
 
-def get_next_section_key(state: GraphState) -> GraphState:
+def get_next_section_key(state: GraphState) -> Dict:
     """Updates the current section key for the next section to write."""
-    outline = state.get('tutorial_outline', {})
-    sections = outline.get('sections', [])
-    drafts = state.get('section_drafts', {})
-    
-    # Find the next section that hasn't been written yet
-    next_key = str(len(drafts))
+    next_key = next_section_key(state) or str(len(state.get('tutorial_outline', {}).get('sections', [])))
     
-    return {
-        "original_query": state.get("original_query", ""),
-        "scraped_content": state.get("scraped_content", ""),
-        "tutorial_outline": state.get("tutorial_outline", {}),
-        "section_drafts": state.get("section_drafts", {}),
-        "final_tutorial": state.get("final_tutorial", ""),
-        "html_content": state.get("html_content", ""),
-        "error_message": state.get("error_message", ""),
-        "current_section_key": next_key,
-        "enhanced_sections": state.get("enhanced_sections", {}),
-        "code_examples": state.get("code_examples", {}),
-        "concept_explanations": state.get("concept_explanations", {})
+    return {"current_section_key": next_key}
+
+def route_start(state: GraphState) -> str:
+    if not state.get("tutorial_outline"):
+        return "summarize_corpus"
+    return "get_next_section_key" if next_section_key(state) is not None else "compile_tutorial"
+
+def plan_incremental_update(previous: Dict, corpus_ref: str, corpus_id: str,
+                            config: Optional[RunnableConfig] = None) -> Tuple[Dict, List[str]]:
+    """Initial state for refreshing a finished tutorial against a recrawled corpus.
+
+    Re-runs retrieval for every section of the previous outline and keeps the
+    drafts whose source chunks are unchanged. Returns the state and the keys of
+    the sections that will be regenerated.
+    """
+    state = {
+        "original_query": previous.get("original_query", ""),
+        "source_url": previous.get("source_url", ""),
+        "corpus_ref": corpus_ref,
+        "corpus_id": corpus_id,
+        "tutorial_outline": previous.get("tutorial_outline", {}),
+        "section_drafts": {},
+        "section_sources": {},
+        "final_tutorial": "",
+        "html_content": "",
+        "error_message": "",
+        "current_section_key": "0",
+        "section_failures": {},
+        "enhanced_sections": {},
+        "code_examples": {},
+        "concept_explanations": {}
     }
+    previous_drafts = previous.get("section_drafts", {})
+    previous_sources = previous.get("section_sources", {})
+    changed = []
+    for i, section_info in enumerate(state["tutorial_outline"].get("sections", [])):
+        key = str(i)
+        _, sources = build_section_context(state, section_info, config)
+        if key in previous_drafts and key in previous_sources and set(previous_sources[key]) == set(sources):
+            state["section_drafts"][key] = previous_drafts[key]
+            state["section_sources"][key] = previous_sources[key]
+        else:
+            changed.append(key)
+    return state, changed
+
+def create_tutorial_graph(checkpointer=None):
+    """Create the enhanced tutorial generation graph.
 
-def create_tutorial_graph():
-    """Create the enhanced tutorial generation graph."""
+    With a checkpointer, state is saved after every step under the run's
+    thread_id, so an interrupted run resumes without re-running finished nodes.
+    """
     workflow = StateGraph(GraphState)
+    workflow.add_node("summarize_corpus", summarize_corpus)
     workflow.add_node("generate_outline", generate_outline)
     workflow.add_node("write_section", write_enhanced_section)
     workflow.add_node("compile_tutorial", compile_tutorial)
     workflow.add_node("get_next_section_key", get_next_section_key)
     
-    workflow.set_entry_point("generate_outline")
+    # Incremental regenerations arrive with the previous outline and the unchanged drafts
+    workflow.set_conditional_entry_point(
+        route_start,
+        {
+            "summarize_corpus": "summarize_corpus",
+            "get_next_section_key": "get_next_section_key",
+            "compile_tutorial": "compile_tutorial"
+        }
+    )
+    
+    workflow.add_edge("summarize_corpus", "generate_outline")
     
     workflow.add_conditional_edges(
         "generate_outline",
@@ -1314,5 +1289,5 @@ def create_tutorial_graph():
     
     workflow.add_edge("compile_tutorial", END)
     
-    app = workflow.compile()
+    app = workflow.compile(checkpointer=checkpointer)
     return app
\ No newline at end of file
@@ -0,0 +1,249 @@
+"""
+Single-pass Markdown parsing shared by the HTML, PDF and DOCX exporters.
+
+Section content is tokenized once, line by line, into a small list of blocks;
+each exporter walks the blocks instead of re-parsing the Markdown with its own
+regexes. Every pattern here is anchored or uses negated character classes, so
+parsing stays linear in the input size whatever the LLM produced.
+"""
+
+import re
+from html import escape
+from typing import List, NamedTuple, Tuple
+
+from agents.code_highlight import highlight
+
+# An inline span: (kind, text) with kind one of "text", "bold", "italic", "code"
+Inline = Tuple[str, str]
+
+
+class Heading(NamedTuple):
+    level: int
+    inlines: List[Inline]
+
+
+class Paragraph(NamedTuple):
+    lines: List[List[Inline]]  # hard line breaks are kept, as the HTML output always did
+
+
+class CodeBlock(NamedTuple):
+    language: str
+    code: str
+
+
+class ListBlock(NamedTuple):
+    ordered: bool
+    items: List[List[Inline]]
+
+
+class Note(NamedTuple):
+    lines: List[List[Inline]]
+
+
+_HEADING = re.compile(r"(#{1,6})\s+(.*)")
+_FENCE = re.compile(r"\s{0,3}(```|~~~)\s*([\w+#.-]*)")
+_BULLET = re.compile(r"\s{0,3}[-*+]\s+(.*)")
+_NUMBERED = re.compile(r"\s{0,3}\d{1,9}[.)]\s+(.*)")
+_NOTE = re.compile(r"\s{0,3}>\s?(.*)")
+# Any line that starts a block other than a paragraph
+_BLOCK_START = re.compile(r"\s{0,3}(?:```|~~~|[-*+]\s|\d{1,9}[.)]\s|>)|\s*#{1,6}\s+\S")
+# Code spans first so markup inside them stays literal; no class can run past a line
+_INLINE = re.compile(r"`([^`\n]+)`|\*\*([^*\n]+)\*\*|__([^_\n]+)__|\*([^*\n]+)\*")
+
+
+def parse_inline(text: str) -> List[Inline]:
+    """Split one line of text into plain, bold, italic and code spans."""
+    spans: List[Inline] = []
+    position = 0
+    for match in _INLINE.finditer(text):
+        if match.start() > position:
+            spans.append(("text", text[position:match.start()]))
+        code, bold, bold_alt, italic = match.groups()
+        if code is not None:
+            spans.append(("code", code))
+        elif italic is not None:
+            spans.append(("italic", italic))
+        else:
+            spans.append(("bold", bold if bold is not None else bold_alt))
+        position = match.end()
+    if position < len(text):
+        spans.append(("text", text[position:]))
+    return spans
+
+
+def _list_item(line: str):
+    """(ordered, item text) if line is a list item, else None."""
+    match = _BULLET.match(line)
+    if match:
+        return False, match.group(1)
+    match = _NUMBERED.match(line)
+    if match:
+        return True, match.group(1)
+    return None
+
+
+def parse_markdown(text: str) -> list:
+    """Parse section Markdown into blocks in a single pass over its lines."""
+    lines = text.replace("\r\n", "\n").split("\n")
+    blocks = []
+    i = 0
+    count = len(lines)
+    while i < count:
+        line = lines[i]
+        stripped = line.strip()
+        if not stripped:
+            i += 1
+            continue
+
+        fence = _FENCE.match(line)
+        if fence:
+            marker = fence.group(1)
+            code_lines = []
+            i += 1
+            # An unclosed fence runs to the end of the section
+            while i < count and not lines[i].lstrip().startswith(marker):
+                code_lines.append(lines[i])
+                i += 1
+            i += 1
+            blocks.append(CodeBlock(fence.group(2).lower(), "\n".join(code_lines)))
+            continue
+
+        heading = _HEADING.match(stripped)
+        if heading:
+            blocks.append(Heading(len(heading.group(1)), parse_inline(heading.group(2).rstrip("# \t"))))
+            i += 1
+            continue
+
+        item = _list_item(line)
+        if item:
+            ordered = item[0]
+            items = []
+            while i < count:
+                item = _list_item(lines[i])
+                if item and item[0] == ordered:
+                    items.append(parse_inline(item[1].strip()))
+                    i += 1
+                elif not lines[i].strip():
+                    # Blank lines between items of the same kind keep the list going
+                    j = i
+                    while j < count and not lines[j].strip():
+                        j += 1
+                    next_item = _list_item(lines[j]) if j < count else None
+                    if not next_item or next_item[0] != ordered:
+                        break
+                    i = j
+                elif lines[i][:1].isspace() and items and not _FENCE.match(lines[i].lstrip()):
+                    # Indented continuation of the previous item, extended in place to stay linear
+                    items[-1].append(("text", " "))
+                    items[-1].extend(parse_inline(lines[i].strip()))
+                    i += 1
+                else:
+                    break
+            blocks.append(ListBlock(ordered, items))
+            continue
+
+        if _NOTE.match(line):
+            note_lines = []
+            while i < count:
+                note = _NOTE.match(lines[i])
+                if not note:
+                    break
+                note_lines.append(parse_inline(note.group(1).strip()))
+                i += 1
+            blocks.append(Note(note_lines))
+            continue
+
+        # The first line always belongs to the paragraph, so every pass consumes at least one line
+        paragraph_lines = [parse_inline(stripped)]
+        i += 1
+        while i < count:
+            line = lines[i]
+            if not line.strip() or _BLOCK_START.match(line):
+                break
+            paragraph_lines.append(parse_inline(line.strip()))
+            i += 1
+        blocks.append(Paragraph(paragraph_lines))
+    return blocks
+
+
+def plain_text(inlines: List[Inline]) -> str:
+    """Inline spans with the markup dropped."""
+    return "".join(text for _, text in inlines)
+
+
+# --- HTML -------------------------------------------------------------------
+
+_HTML_INLINE = {
+    "text": "{}",
+    "bold": "<strong>{}</strong>",
+    "italic": "<em>{}</em>",
+    "code": '<code class="inline-code">{}</code>',
+}
+
+
+def inline_html(inlines: List[Inline]) -> str:
+    return "".join(_HTML_INLINE[kind].format(escape(text, quote=False)) for kind, text in inlines)
+
+
+def code_html(code: str, language: str) -> str:
+    """Highlighted code; the token classes are styled by the page's stylesheet."""
+    return "".join(f'<span class="tok-{category}">{escape(text, quote=False)}</span>' if category
+                   else escape(text, quote=False) for category, text in highlight(code, language))
+
+
+def render_html(blocks: list) -> str:
+    """HTML for the tutorial page, using the page's existing CSS classes."""
+    parts = []
+    for block in blocks:
+        if isinstance(block, Paragraph):
+            parts.append(f"<p>{'<br>'.join(inline_html(line) for line in block.lines)}</p>")
+        elif isinstance(block, Heading):
+            parts.append(f"<h{block.level}>{inline_html(block.inlines)}</h{block.level}>")
+        elif isinstance(block, CodeBlock):
+            parts.append(f'<div class="code-block"><pre><code>{code_html(block.code, block.language)}</code></pre></div>')
+        elif isinstance(block, ListBlock):
+            tag = "ol" if block.ordered else "ul"
+            items = "".join(f"<li>{inline_html(item)}</li>" for item in block.items)
+            parts.append(f"<{tag}>{items}</{tag}>")
+        elif isinstance(block, Note):
+            parts.append(f"<div class=\"note-box\">{'<br>'.join(inline_html(line) for line in block.lines)}</div>")
+    return "\n".join(parts)
+
+
+# --- ReportLab ----------------------------------------------------------------
+
+_REPORTLAB_INLINE = {
+    "text": "{}",
+    "bold": "<b>{}</b>",
+    "italic": "<i>{}</i>",
+    "code": '<font name="Courier">{}</font>',
+}
+
+
+def inline_reportlab(inlines: List[Inline]) -> str:
+    """ReportLab Paragraph markup; text is escaped, since stray < or & would break the parser."""
+    return "".join(_REPORTLAB_INLINE[kind].format(escape(text, quote=False)) for kind, text in inlines)
+
+
+# --- WordprocessingML -----------------------------------------------------------
+
+# Characters XML 1.0 cannot contain (control characters, lone surrogates); Word rejects the file otherwise
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+
+_WORDML_INLINE = {
+    "text": "",
+    "bold": "<w:rPr><w:b/></w:rPr>",
+    "italic": "<w:rPr><w:i/></w:rPr>",
+    "code": '<w:rPr><w:rStyle w:val="InlineCode"/></w:rPr>',
+}
+
+
+def wordml_text(text: str) -> str:
+    """Text escaped for a <w:t> element."""
+    return escape(_XML_ILLEGAL.sub("", text), quote=False)
+
+
+def inline_wordml(inlines: List[Inline]) -> str:
+    """DOCX runs (<w:r>) for inline spans, formatted by the styles in templates/docx."""
+    return "".join(f'<w:r>{_WORDML_INLINE[kind]}<w:t xml:space="preserve">{wordml_text(text)}</w:t></w:r>'
+                   for kind, text in inlines if text)
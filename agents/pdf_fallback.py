@@ -1,35 +1,44 @@
 """
 Fallback PDF generation for when WeasyPrint fails on Windows
+
+agents/pdf_sections.py renders the cover and each section as separate PDFs
+with these functions and merges them, so no story ever spans more than one
+section. Styles are built once per process and each section's Markdown is
+parsed once.
 """
 
-def create_pdf_with_reportlab(title: str, sections: list, metadata: dict, output_path: str):
-    """Create a PDF using ReportLab as fallback when WeasyPrint fails."""
-    try:
-        from reportlab.lib.pagesizes import A4
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import inch
-        from reportlab.lib.colors import HexColor
-        import re
-        
-        # Create PDF document
-        doc = SimpleDocTemplate(output_path, pagesize=A4, 
-                              topMargin=1*inch, bottomMargin=1*inch,
-                              leftMargin=1.2*inch, rightMargin=1.2*inch)
-        styles = getSampleStyleSheet()
-        story = []
-        
-        # Custom styles
-        title_style = ParagraphStyle(
+from functools import lru_cache
+from typing import Iterable, Iterator
+
+from agents.code_highlight import highlight, print_style
+from agents.exporters import section_display_title
+from agents.markdown_renderer import parse_markdown, inline_reportlab, Heading, CodeBlock, ListBlock
+
+
+@lru_cache(maxsize=1)
+def pdf_styles() -> dict:
+    """Paragraph styles, built once per process and shared by every document."""
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.colors import HexColor
+
+    styles = getSampleStyleSheet()
+    return {
+        "normal": styles['Normal'],
+        # Paragraphs, notes and lists: the gap after a block comes from the style, not a Spacer per block
+        "body": ParagraphStyle(
+            'Body',
+            parent=styles['Normal'],
+            spaceAfter=6
+        ),
+        "title": ParagraphStyle(
             'CustomTitle',
             parent=styles['Heading1'],
             fontSize=24,
             spaceAfter=30,
             alignment=1,  # Center alignment
             textColor=HexColor('#2d3748')
-        )
-        
-        subtitle_style = ParagraphStyle(
+        ),
+        "subtitle": ParagraphStyle(
             'CustomSubtitle',
             parent=styles['Normal'],
             fontSize=14,
@@ -37,122 +46,235 @@ def create_pdf_with_reportlab(title: str, sections: list, metadata: dict, output
             alignment=1,
             textColor=HexColor('#718096'),
             fontName='Helvetica-Oblique'
-        )
-        
-        section_title_style = ParagraphStyle(
+        ),
+        "section_title": ParagraphStyle(
             'SectionTitle',
             parent=styles['Heading2'],
             fontSize=18,
             spaceAfter=15,
             spaceBefore=20,
             textColor=HexColor('#667eea')
-        )
-        
-        # Add title
-        story.append(Paragraph(title, title_style))
-        story.append(Paragraph("A comprehensive, step-by-step guide to mastering every concept", subtitle_style))
-        story.append(Spacer(1, 20))
-        
-        # Add metadata
-        metadata_text = f"Generated: {metadata.get('generated_at', 'Unknown')} | Source: {metadata.get('source_query', 'Unknown')} | Sections: {len(sections)}"
-        story.append(Paragraph(metadata_text, styles['Normal']))
-        story.append(Spacer(1, 30))
-        
-        # Add table of contents
-        toc_style = ParagraphStyle(
+        ),
+        "toc": ParagraphStyle(
             'TOCTitle',
             parent=styles['Heading2'],
             fontSize=16,
             spaceAfter=15,
             textColor=HexColor('#495057')
-        )
-        story.append(Paragraph("Table of Contents", toc_style))
-        
-        for i, section in enumerate(sections):
-            section_title = section.get('title', 'Section').replace('## ', '').replace('# ', '')
-            toc_item = f"{i+1}. {section_title}"
-            story.append(Paragraph(toc_item, styles['Normal']))
-        
-        story.append(PageBreak())
-        
-        # Add sections
-        for i, section in enumerate(sections):
-            section_title = section.get('title', 'Section').replace('## ', '').replace('# ', '')
-            section_content = section.get('content', '')
-            
-            # Section heading
-            story.append(Paragraph(f"{i+1}. {section_title}", section_title_style))
-            story.append(Spacer(1, 12))
-            
-            # Process content - simplified approach
-            paragraphs = section_content.split('\n\n')
-            
-            for para in paragraphs:
-                para = para.strip()
-                if not para:
-                    continue
-                    
-                # Handle code blocks
-                if para.startswith('```'):
-                    code_content = re.sub(r'```.*?\n(.*?)\n```', r'\1', para, flags=re.DOTALL)
-                    if code_content:
-                        code_style = ParagraphStyle(
-                            'Code',
-                            parent=styles['Normal'],
-                            fontSize=10,
-                            fontName='Courier',
-                            leftIndent=20,
-                            rightIndent=20,
-                            spaceAfter=12,
-                            spaceBefore=12,
-                            backColor=HexColor('#f8f9fa')
-                        )
-                        story.append(Paragraph(code_content, code_style))
-                    continue
-                
-                # Handle headers
-                if para.startswith('###'):
-                    header_text = para.replace('###', '').strip()
-                    header_style = ParagraphStyle(
-                        'SubHeader',
-                        parent=styles['Heading3'],
-                        fontSize=14,
-                        spaceAfter=10,
-                        spaceBefore=15,
-                        textColor=HexColor('#4a5568')
-                    )
-                    story.append(Paragraph(header_text, header_style))
-                    continue
-                
-                # Handle lists
-                if para.startswith('- ') or para.startswith('* '):
-                    list_items = para.split('\n')
-                    for item in list_items:
-                        if item.strip().startswith(('- ', '* ')):
-                            item_text = item.strip()[2:]  # Remove bullet
-                            story.append(Paragraph(f"• {item_text}", styles['Normal']))
-                    story.append(Spacer(1, 6))
-                    continue
-                
-                # Regular paragraphs
-                # Clean up markdown formatting
-                clean_text = para
-                clean_text = re.sub(r'\*\*([^*]+)\*\*', r'<b>\1</b>', clean_text)  # Bold
-                clean_text = re.sub(r'\*([^*]+)\*', r'<i>\1</i>', clean_text)      # Italic
-                clean_text = re.sub(r'`([^`]+)`', r'<font name="Courier">\1</font>', clean_text)  # Inline code
-                clean_text = re.sub(r'#{1,6}\s*', '', clean_text)  # Remove remaining headers
-                
-                if clean_text.strip():
-                    story.append(Paragraph(clean_text, styles['Normal']))
-                    story.append(Spacer(1, 6))
-            
-            # Add spacing between sections
-            story.append(Spacer(1, 30))
-        
-        # Build PDF
-        doc.build(story)
+        ),
+        "code": ParagraphStyle(
+            'Code',
+            parent=styles['Normal'],
+            fontSize=10,
+            fontName='Courier',
+            leftIndent=20,
+            rightIndent=20,
+            spaceAfter=12,
+            spaceBefore=12,
+            backColor=HexColor('#f8f9fa'),
+            borderPadding=4
+        ),
+        "header": ParagraphStyle(
+            'SubHeader',
+            parent=styles['Heading3'],
+            fontSize=14,
+            spaceAfter=10,
+            spaceBefore=15,
+            textColor=HexColor('#4a5568')
+        ),
+    }
+
+def page_layout() -> dict:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import inch
+
+    return {"pagesize": A4, "topMargin": 1 * inch, "bottomMargin": 1 * inch,
+            "leftMargin": 1.2 * inch, "rightMargin": 1.2 * inch}
+
+@lru_cache(maxsize=1)
+def code_line_length() -> int:
+    """Characters of code that fit on one line of the page, in the code style."""
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    layout = page_layout()
+    style = pdf_styles()["code"]
+    width = layout["pagesize"][0] - layout["leftMargin"] - layout["rightMargin"] - style.leftIndent - style.rightIndent
+    return max(20, int(width // stringWidth("M", style.fontName, style.fontSize)))
+
+# Prefix of the continuation of a wrapped code line
+CODE_CONTINUATION = "  "
+# Courier face by (bold, italic)
+COURIER_FACES = {(False, False): "Courier", (True, False): "Courier-Bold",
+                 (False, True): "Courier-Oblique", (True, True): "Courier-BoldOblique"}
+
+@lru_cache(maxsize=512)
+def code_lines(code: str, language: str) -> tuple:
+    """Highlighted code wrapped to the page width, as a tuple of lines of (color, font, text) runs.
+
+    Memoized per worker, so a snippet repeated across sections is laid out once.
+    """
+    from reportlab.lib.colors import HexColor
+
+    width = code_line_length()
+    lines, runs, column = [], [], 0
+    # Courier has no tab glyph
+    for category, text in highlight(code.expandtabs(4), language):
+        color, bold, italic = print_style(category) or (None, False, False)
+        color, font = color and HexColor(color), COURIER_FACES[(bold, italic)]
+        for index, piece in enumerate(text.split("\n")):
+            if index:
+                lines.append(tuple(runs))
+                runs, column = [], 0
+            while column + len(piece) > width:
+                cut = width - column
+                if cut:
+                    runs.append((color, font, piece[:cut]))
+                lines.append(tuple(runs))
+                runs, column = [(None, "Courier", CODE_CONTINUATION)], len(CODE_CONTINUATION)
+                piece = piece[cut:]
+            if piece:
+                runs.append((color, font, piece))
+                column += len(piece)
+    lines.append(tuple(runs))
+
+    # Blank lines around the code are dropped, as Preformatted does
+    while lines and not lines[-1]:
+        lines.pop()
+    start = 0
+    while start < len(lines) and not lines[start]:
+        start += 1
+    return tuple(lines[start:])
+
+@lru_cache(maxsize=1)
+def code_block_class():
+    """A flowable that draws prepared code lines straight onto the canvas.
+
+    XPreformatted would parse color markup for every block, which costs
+    more than laying the page out; this only draws runs, and splits
+    between lines.
+    """
+    from reportlab.platypus import Flowable
+
+    class CodeBlockFlowable(Flowable):
+        def __init__(self, lines, style):
+            super().__init__()
+            self.lines = lines
+            self.style = style
+
+        def wrap(self, availWidth, availHeight):
+            self.width = availWidth
+            self.height = len(self.lines) * self.style.leading
+            return self.width, self.height
+
+        def split(self, availWidth, availHeight):
+            fit = int(availHeight // self.style.leading)
+            if fit <= 0 or fit >= len(self.lines):
+                return []
+            return [CodeBlockFlowable(self.lines[:fit], self.style), CodeBlockFlowable(self.lines[fit:], self.style)]
+
+        def getSpaceBefore(self):
+            return self.style.spaceBefore
+
+        def getSpaceAfter(self):
+            return self.style.spaceAfter
+
+        def draw(self):
+            style, canvas = self.style, self.canv
+            padding = style.borderPadding
+            canvas.saveState()
+            canvas.setFillColor(style.backColor)
+            canvas.rect(style.leftIndent - padding, -padding,
+                        self.width - style.leftIndent - style.rightIndent + 2 * padding, self.height + 2 * padding,
+                        stroke=0, fill=1)
+            text = canvas.beginText()
+            for number, runs in enumerate(self.lines):
+                text.setTextOrigin(style.leftIndent, self.height - style.fontSize - number * style.leading)
+                for color, font, chunk in runs:
+                    text.setFont(font, style.fontSize)
+                    text.setFillColor(color or style.textColor)
+                    text.textOut(chunk)
+            canvas.drawText(text)
+            canvas.restoreState()
+
+    return CodeBlockFlowable
+
+def code_block(code: str, language: str = ""):
+    """Highlighted code exactly as written, on a shaded background; long lines wrap and long blocks split across pages."""
+    return code_block_class()(code_lines(code, language), pdf_styles()["code"])
+
+def cover_flowables(title: str, sections: list, metadata: dict, page_numbers: list = None) -> Iterator:
+    """Title, metadata and table of contents; page_numbers adds each section's page to the TOC."""
+    from reportlab.platypus import Paragraph, Spacer
+    from xml.sax.saxutils import escape
+
+    styles = pdf_styles()
+
+    # Add title
+    yield Paragraph(escape(title), styles["title"])
+    yield Paragraph("A comprehensive, step-by-step guide to mastering every concept", styles["subtitle"])
+    yield Spacer(1, 20)
+
+    # Add metadata
+    metadata_text = f"Generated: {metadata.get('generated_at', 'Unknown')} | Source: {metadata.get('source_query', 'Unknown')} | Sections: {len(sections)}"
+    yield Paragraph(escape(metadata_text), styles["normal"])
+    yield Spacer(1, 30)
+
+    # Add table of contents
+    yield Paragraph("Table of Contents", styles["toc"])
+
+    for i, section in enumerate(sections):
+        toc_item = f"{i+1}. {escape(section_display_title(section))}"
+        if page_numbers:
+            toc_item += f" <font color='#718096'>(page {page_numbers[i]})</font>"
+        yield Paragraph(toc_item, styles["normal"])
+
+def section_flowables(number: int, section: dict) -> Iterator:
+    """One section, from its parsed Markdown blocks."""
+    from reportlab.platypus import Paragraph, Spacer
+    from xml.sax.saxutils import escape
+
+    styles = pdf_styles()
+
+    # Section heading
+    yield Paragraph(f"{number}. {escape(section_display_title(section))}", styles["section_title"])
+    yield Spacer(1, 12)
+
+    for block in section.get('blocks') or parse_markdown(section.get('content', '')):
+        if isinstance(block, CodeBlock):
+            if block.code.strip():
+                yield code_block(block.code, block.language)
+        elif isinstance(block, Heading):
+            yield Paragraph(inline_reportlab(block.inlines), styles["header"])
+        elif isinstance(block, ListBlock):
+            # One Paragraph per list: ReportLab's cost is mostly per Paragraph, and items are single lines anyway
+            yield Paragraph("<br/>".join(
+                f"{f'{item_number}.' if block.ordered else '•'} {inline_reportlab(item)}"
+                for item_number, item in enumerate(block.items, 1)
+            ), styles["body"])
+        else:
+            # Paragraphs and notes
+            text = "<br/>".join(inline_reportlab(line) for line in block.lines)
+            if text.strip():
+                yield Paragraph(text, styles["body"])
+
+def build_pdf(flowables: Iterable, output_path: str) -> None:
+    from reportlab.platypus import SimpleDocTemplate
+
+    doc = SimpleDocTemplate(output_path, **page_layout())
+    doc.build(list(flowables))
+
+def create_cover_pdf(title: str, sections: list, metadata: dict, output_path: str, page_numbers: list = None) -> bool:
+    try:
+        build_pdf(cover_flowables(title, sections, metadata, page_numbers), output_path)
+        return True
+    except Exception as e:
+        print(f"ReportLab cover generation failed: {e}")
+        return False
+
+def create_section_pdf(number: int, section: dict, output_path: str) -> bool:
+    try:
+        build_pdf(section_flowables(number, section), output_path)
         return True
-        
     except Exception as e:
-        print(f"ReportLab PDF generation failed: {e}")
-        return False
\ No newline at end of file
+        print(f"ReportLab generation of section {number} failed: {e}")
+        return False
@@ -0,0 +1,200 @@
+"""
+Per-section PDF rendering for large tutorials.
+
+Laying a 100+ page tutorial out in one WeasyPrint call takes time and memory
+that grow faster than the page count, and one bad section fails the whole
+file. Instead, the cover/TOC and every section are rendered as separate PDFs
+in the export pool, then merged with pypdf behind a TOC whose page numbers
+come from the section page counts, plus a bookmark per section.
+
+Section PDFs are cached under a hash of their content, so after a section is
+regenerated only that section is laid out again. A section that cannot be
+rendered is replaced by a one-page placeholder.
+"""
+
+import os
+import json
+import hashlib
+import concurrent.futures
+from typing import Callable, List, Optional
+
+from agents.exporters import (TUTORIAL_DIR, RENDER_VERSION, PDF_CSS, header_html, toc_html, section_html, footer_html,
+                              html_document, section_display_title)
+
+SECTION_CACHE_DIR = os.path.join(TUTORIAL_DIR, "artifacts", "sections")
+
+# WeasyPrint module, parsed stylesheet and font configuration, loaded once per worker
+_weasyprint = None
+
+
+def weasyprint_resources():
+    """(weasyprint, stylesheet, font config), or None where WeasyPrint cannot load (e.g. no Pango)."""
+    global _weasyprint
+    if _weasyprint is None:
+        try:
+            import weasyprint
+            from weasyprint.text.fonts import FontConfiguration
+
+            font_config = FontConfiguration()
+            _weasyprint = (weasyprint, weasyprint.CSS(string=PDF_CSS, font_config=font_config), font_config)
+        except Exception as e:
+            print(f"⚠️  WeasyPrint unavailable, using ReportLab for PDFs: {str(e)[:100]}")
+            _weasyprint = False
+    return _weasyprint or None
+
+def write_html_pdf(title: str, body: str, path: str) -> bool:
+    """Lay out body with WeasyPrint using the shared stylesheet; False if WeasyPrint is unavailable or fails."""
+    resources = weasyprint_resources()
+    if resources is None:
+        return False
+    weasyprint, stylesheet, font_config = resources
+    try:
+        weasyprint.HTML(string=html_document(title, body)).write_pdf(
+            path, stylesheets=[stylesheet], font_config=font_config)
+        return True
+    except Exception as e:
+        print(f"⚠️  WeasyPrint failed on {os.path.basename(path)}: {str(e)[:100]}")
+        return False
+
+def page_count(path: str) -> int:
+    from pypdf import PdfReader
+
+    return len(PdfReader(path).pages)
+
+def atomic_render(render: Callable[[str], bool], path: str) -> int:
+    """Run render(tmp_path), move the result to path and return its page count (0 on failure)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        if not render(tmp_path):
+            return 0
+        pages = page_count(tmp_path)
+        os.replace(tmp_path, path)
+        return pages
+    except Exception as e:
+        print(f"❌ Rendering {os.path.basename(path)} failed: {e}")
+        return 0
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def render_section_pdf(number: int, section: dict, path: str) -> int:
+    """Render one section to path. Runs in an export worker; returns the page count, 0 on failure."""
+    from agents.markdown_renderer import parse_markdown
+    from agents.pdf_fallback import create_section_pdf
+
+    section = dict(section, blocks=parse_markdown(section.get('content', '')))
+
+    def render(tmp):
+        # The HTML body is only built where WeasyPrint can lay it out
+        if weasyprint_resources() is not None:
+            body = f'''
+        <div class="content">
+{section_html(number, section)}
+        </div>'''
+            if write_html_pdf(section_display_title(section), body, tmp):
+                return True
+        return create_section_pdf(number, section, tmp)
+
+    return atomic_render(render, path)
+
+def render_cover_pdf(title: str, sections: list, metadata: dict, page_numbers: List[int], path: str) -> int:
+    """Render the title page and the table of contents with page numbers. Runs in an export worker."""
+    from agents.pdf_fallback import create_cover_pdf
+
+    body = f'''{header_html(title, metadata, len(sections))}
+        <div class="content">
+{toc_html(sections, page_numbers)}
+        </div>
+{footer_html()}'''
+    return atomic_render(
+        lambda tmp: write_html_pdf(title, body, tmp) or create_cover_pdf(title, sections, metadata, tmp, page_numbers),
+        path
+    )
+
+def section_cache_path(number: int, section: dict) -> str:
+    key = json.dumps([RENDER_VERSION, number, section.get('title', ''), section.get('content', '')], ensure_ascii=False)
+    return os.path.join(SECTION_CACHE_DIR, f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.pdf")
+
+def placeholder_section(section: dict) -> dict:
+    return {
+        "title": section.get('title', 'Section'),
+        "content": "> This section could not be rendered to PDF. It is complete in the HTML and DOCX versions."
+    }
+
+def render_tutorial_pdf(tutorial: dict, path: str, submit: Callable[..., concurrent.futures.Future]) -> bool:
+    """Render the stored tutorial to path section by section and merge the parts.
+
+    Runs in the server process, coordinating; the layout work goes to submit()
+    (the export pool), all sections in parallel.
+    """
+    from pypdf import PdfWriter
+
+    title, metadata, sections = tutorial["title"], tutorial["metadata"], tutorial["sections"]
+
+    # 1. Sections: cached ones are reused, the rest render in parallel
+    parts: List[Optional[str]] = []
+    counts: List[int] = []
+    jobs = {}
+    for number, section in enumerate(sections, 1):
+        part = section_cache_path(number, section)
+        parts.append(part)
+        counts.append(0)
+        if os.path.exists(part):
+            counts[-1] = page_count(part)
+        else:
+            jobs[number - 1] = submit(render_section_pdf, number, section, part)
+    if sections:
+        print(f"📄 Rendering {len(jobs)} of {len(sections)} PDF sections ({len(sections) - len(jobs)} cached)")
+
+    for index, job in jobs.items():
+        try:
+            counts[index] = job.result()
+        except Exception as e:
+            print(f"❌ PDF section {index + 1} failed: {e}")
+        if not counts[index]:
+            # Not cached: the placeholder must not stand in for the section next time
+            placeholder = f"{path}.section-{index + 1}.placeholder.pdf"
+            counts[index] = submit(render_section_pdf, index + 1, placeholder_section(sections[index]),
+                                   placeholder).result()
+            parts[index] = placeholder if counts[index] else None
+
+    # 2. Cover and TOC, numbered from the section page counts; the cover's
+    #    own length is guessed and the cover re-rendered if the guess was wrong
+    cover = f"{path}.cover.pdf"
+    cover_pages = 1
+    for _ in range(3):
+        page_numbers, page = [], cover_pages + 1
+        for count in counts:
+            page_numbers.append(page)
+            page += count
+        rendered = submit(render_cover_pdf, title, sections, metadata, page_numbers, cover).result()
+        if not rendered or rendered == cover_pages:
+            break
+        cover_pages = rendered
+
+    # 3. Merge, with a bookmark per section
+    writer = PdfWriter()
+    temporary = [cover] + [part for part in parts if part and part.endswith(".placeholder.pdf")]
+    try:
+        if os.path.exists(cover):
+            writer.append(cover, import_outline=False)
+        for number, (part, section) in enumerate(zip(parts, sections), 1):
+            if not part:
+                continue
+            start = len(writer.pages)
+            # Our own bookmarks replace the per-part heading outlines WeasyPrint writes
+            writer.append(part, import_outline=False)
+            writer.add_outline_item(f"{number}. {section_display_title(section)}", start)
+        if not len(writer.pages):
+            return False
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            writer.write(f)
+        os.replace(tmp_path, path)
+        print(f"✅ PDF saved: {path} ({len(writer.pages)} pages)")
+        return True
+    finally:
+        for leftover in temporary:
+            if os.path.exists(leftover):
+                os.remove(leftover)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for section Markdown rendering: the single-pass parser in
+agents/markdown_renderer.py versus the regex chain it replaced.
+
+Usage:
+    python benchmarks/markdown_render.py --repeat 20
+
+Besides a typical generated section, it times inputs that make regexes
+backtrack or stall, or that copy their output as it grows (long runs of list
+items and indented continuation lines, raw <li> tags, unclosed emphasis and
+fences, heading markers with no text). Any input that takes longer than
+--guard-seconds to parse is reported as a failure, so the script can guard
+against regressions.
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.markdown_renderer import parse_markdown, render_html
+
+
+def legacy_convert_markdown_to_html(content):
+    """The per-feature re.sub chain previously used for the HTML export, kept here for comparison."""
+    html_content = re.sub(r'```(\w+)?\n(.*?)\n```',
+                          lambda m: f'<div class="code-block"><pre><code>{m.group(2).replace("<", "&lt;").replace(">", "&gt;")}</code></pre></div>',
+                          content, flags=re.DOTALL)
+    html_content = re.sub(r'`([^`]+)`', r'<code class="inline-code">\1</code>', html_content)
+    html_content = re.sub(r'\*\*([^*]+)\*\*', r'<strong>\1</strong>', html_content)
+    html_content = re.sub(r'\*([^*]+)\*', r'<em>\1</em>', html_content)
+    html_content = re.sub(r'^### (.+)$', r'<h3>\1</h3>', html_content, flags=re.MULTILINE)
+    html_content = re.sub(r'^## (.+)$', r'<h2>\1</h2>', html_content, flags=re.MULTILINE)
+    html_content = re.sub(r'^# (.+)$', r'<h1>\1</h1>', html_content, flags=re.MULTILINE)
+    html_content = re.sub(r'^> (.+)$', r'<div class="note-box">\1</div>', html_content, flags=re.MULTILINE)
+    html_content = re.sub(r'^- (.+)$', r'<li>\1</li>', html_content, flags=re.MULTILINE)
+    html_content = re.sub(r'^(\d+)\. (.+)$', r'<li>\2</li>', html_content, flags=re.MULTILINE)
+    html_content = re.sub(r'(<li>.*?</li>)(?:\s*<li>.*?</li>)*', lambda m: f'<ul>{m.group(0)}</ul>', html_content, flags=re.DOTALL)
+    formatted = []
+    for para in html_content.split('\n\n'):
+        para = para.strip()
+        if para and not para.startswith('<'):
+            para = f'<p>{para.replace(chr(10), "<br>")}</p>'
+        formatted.append(para)
+    return '\n'.join(formatted)
+
+
+def typical_section(parts=40):
+    chunks = []
+    for i in range(parts):
+        chunks.append(f"### Step {i}\n\nThis step configures the **client** with `timeout={i}` and an *optional* retry policy. "
+                      "It explains why the default is safe and when to change it.\n\n"
+                      f"- First point about step {i}\n- Second point with `code`\n- Third **important** point\n\n"
+                      f"```python\nclient = Client(timeout={i})\nresult = client.fetch('/items')\nprint(result)\n```\n\n"
+                      f"> Note: step {i} is idempotent.")
+    return "\n\n".join(chunks)
+
+
+def pathological_inputs(size):
+    return {
+        "many list items": "\n".join(f"- item {i} with <li> text" for i in range(size)),
+        "list items, blank separated": "\n\n".join(f"- item {i}" for i in range(size)),
+        "unclosed bold": "**" + "word " * size,
+        "stars": "*a" * size,
+        "unclosed fence": "```python\n" + "x = 1\n" * size,
+        "backticks": "`" * size,
+        "heading hashes": "# " + "# " * size,
+        "raw <li> tags": "Tags like " + "<li> " * size,
+        "bare heading markers": "intro\n" + "## \n" * size,
+        "heading markers, tab": "#\t\n" * size,
+        "indented list continuation": "- item\n" + "  more of the **same** item\n" * size,
+    }
+
+
+def time_call(fn, text, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--size", type=int, default=20000, help="Size of the pathological inputs (lines or repetitions)")
+    parser.add_argument("--guard-seconds", type=float, default=1.0, help="Fail if the parser takes longer on any input")
+    parser.add_argument("--skip-legacy", action="store_true", help="Do not time the old regex chain (it can be very slow)")
+    args = parser.parse_args()
+
+    new = lambda text: render_html(parse_markdown(text))
+    cases = {"typical section": typical_section()}
+    cases.update(pathological_inputs(args.size))
+
+    print(f"{'input':<30}{'chars':>10}{'single-pass ms':>16}{'regex chain ms':>16}")
+    failures = []
+    for name, text in cases.items():
+        repeat = args.repeat if name == "typical section" else 1
+        new_seconds = time_call(new, text, repeat)
+        legacy = "skipped" if args.skip_legacy else f"{time_call(legacy_convert_markdown_to_html, text, repeat) * 1000:.1f}"
+        print(f"{name:<30}{len(text):>10}{new_seconds * 1000:>16.1f}{legacy:>16}")
+        if new_seconds > args.guard_seconds:
+            failures.append(name)
+
+    if failures:
+        print(f"❌ Parsing exceeded {args.guard_seconds}s on: {', '.join(failures)}")
+        sys.exit(1)
+    print("✅ All inputs parsed within the guard")
+
+
+if __name__ == "__main__":
+    main()
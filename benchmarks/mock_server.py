@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the LLM providers and Ollama, for load tests.
+
+Speaks the OpenAI chat-completions API (plain and streaming) and the Ollama
+embeddings API (/api/embed and the legacy /api/embeddings), with configurable
+latency, token rate and error injection. Responses are synthetic but shaped
+like the real thing: outline prompts get a valid outline, JSON-mode section
+prompts get a valid structured section, everything else gets markdown.
+
+Usage:
+    python benchmarks/mock_server.py --port 8001 --latency-ms 400 --tokens-per-second 80 --error-rate 0.02
+
+Then point the app at it:
+    LLM_BASE_URL=http://localhost:8001/v1 OLLAMA_BASE_URL=http://localhost:8001 QDRANT_HOST=:memory: uvicorn main:app --port 8000
+"""
+
+import re
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import argparse
+from collections import Counter
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+APPROX_CHARS_PER_TOKEN = 4
+
+WORDS = ("the", "widget", "configuration", "request", "returns", "client", "server", "value", "handler",
+         "module", "function", "option", "default", "pipeline", "install", "data", "example", "error",
+         "response", "cache", "instance", "method", "parameter", "runs", "with", "and", "for", "to")
+
+
+class MockConfig:
+    def __init__(self, args):
+        self.latency_ms = args.latency_ms
+        self.latency_dist = args.latency_dist
+        self.latency_sigma = args.latency_sigma
+        self.tokens_per_second = args.tokens_per_second
+        self.completion_tokens = args.completion_tokens
+        self.error_rate = args.error_rate
+        self.error_codes = [int(code) for code in args.error_codes.split(",") if code]
+        self.hang_rate = args.hang_rate
+        self.hang_seconds = args.hang_seconds
+        self.stream_cut_rate = args.stream_cut_rate
+        self.embedding_dim = args.embedding_dim
+        self.embed_latency_ms = args.embed_latency_ms
+        self.rng = random.Random(args.seed)
+
+    def first_token_delay(self):
+        """Seconds before the first byte of a response, drawn from the configured distribution."""
+        mean = self.latency_ms / 1000
+        if self.latency_dist == "fixed":
+            return mean
+        if self.latency_dist == "uniform":
+            return self.rng.uniform(0, 2 * mean)
+        if self.latency_dist == "exponential":
+            return self.rng.expovariate(1 / mean) if mean else 0.0
+        # lognormal: latency_ms is the median, sigma controls the tail
+        return mean * math.exp(self.rng.gauss(0, self.latency_sigma))
+
+    def token_delay(self):
+        return 1 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+
+def create_app(config):
+    app = FastAPI(title="Mock LLM / Ollama server")
+    stats = Counter()
+
+    def injected_error():
+        """An error response to return instead of a completion, or None."""
+        if config.error_codes and config.rng.random() < config.error_rate:
+            status = config.rng.choice(config.error_codes)
+            stats[f"error_{status}"] += 1
+            headers = {"retry-after": "1"} if status == 429 else {}
+            return JSONResponse({"error": {"message": f"Injected {status}", "type": "mock_error", "code": status}},
+                                status_code=status, headers=headers)
+        return None
+
+    async def maybe_hang():
+        if config.rng.random() < config.hang_rate:
+            stats["hangs"] += 1
+            await asyncio.sleep(config.hang_seconds)
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "mock-model", "object": "model", "owned_by": "mock"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["chat_completions"] += 1
+        error = injected_error()
+        if error is not None:
+            return error
+        await maybe_hang()
+
+        messages = body.get("messages", [])
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        json_mode = (body.get("response_format") or {}).get("type") == "json_object"
+        max_tokens = min(body.get("max_tokens") or config.completion_tokens, config.completion_tokens)
+        content = synthesize(prompt, json_mode, max_tokens, config.rng)
+        usage = {
+            "prompt_tokens": len(prompt) // APPROX_CHARS_PER_TOKEN,
+            "completion_tokens": len(content) // APPROX_CHARS_PER_TOKEN,
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        model = body.get("model", "mock-model")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.first_token_delay() + config.token_delay() * usage["completion_tokens"])
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+        cut_stream = config.rng.random() < config.stream_cut_rate
+
+        async def events():
+            def chunk(delta, finish_reason=None):
+                return "data: " + json.dumps({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }) + "\n\n"
+
+            await asyncio.sleep(config.first_token_delay())
+            yield chunk({"role": "assistant", "content": ""})
+            pieces = re.findall(r"\S+\s*|\s+", content)
+            for i, piece in enumerate(pieces):
+                if cut_stream and i == len(pieces) // 2:
+                    stats["stream_cuts"] += 1
+                    # Dropping the connection mid-stream looks like a network failure to the client
+                    raise ConnectionResetError("Injected stream cut")
+                yield chunk({"content": piece})
+                delay = config.token_delay() * max(1, len(piece) // APPROX_CHARS_PER_TOKEN)
+                if delay:
+                    await asyncio.sleep(delay)
+            yield chunk({}, "stop")
+            if include_usage:
+                yield "data: " + json.dumps({
+                    "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": model, "choices": [], "usage": usage,
+                }) + "\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        body = await request.json()
+        stats["embed"] += 1
+        error = injected_error()
+        if error is not None:
+            return error
+        inputs = body.get("input", "")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        await asyncio.sleep(config.embed_latency_ms / 1000 * max(1, len(inputs)))
+        return {
+            "model": body.get("model", "mock-embed"),
+            "embeddings": [embed_text(text, config.embedding_dim) for text in inputs],
+        }
+
+    @app.post("/api/embeddings")
+    async def embeddings_legacy(request: Request):
+        body = await request.json()
+        stats["embeddings"] += 1
+        error = injected_error()
+        if error is not None:
+            return error
+        await asyncio.sleep(config.embed_latency_ms / 1000)
+        return {"embedding": embed_text(body.get("prompt", ""), config.embedding_dim)}
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": "mock-embed", "model": "mock-embed"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return dict(stats)
+
+    return app
+
+
+def embed_text(text, dim):
+    """Deterministic bag-of-words hashing embedding, so similar texts land close together."""
+    vector = [0.0] * dim
+    for word in re.findall(r"\w+", text.lower()):
+        digest = hashlib.md5(word.encode("utf-8")).digest()
+        index = int.from_bytes(digest[:4], "little") % dim
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def lorem(rng, tokens):
+    return " ".join(rng.choice(WORDS) for _ in range(max(1, tokens)))
+
+
+def synthesize(prompt, json_mode, max_tokens, rng):
+    """A plausible response for the prompt, roughly max_tokens long."""
+    if '"sections"' in prompt and "brief_description" in prompt:
+        return json.dumps({
+            "title": "Mock Tutorial",
+            "sections": [
+                {"title": f"{i}. Mock Section {i}", "brief_description": lorem(rng, 12)}
+                for i in range(1, 9)
+            ],
+        })
+    if json_mode and '"body"' in prompt:
+        return json.dumps({
+            "body": markdown_body(rng, int(max_tokens * 0.7)),
+            "key_concepts": [{"name": f"Concept {i}", "explanation": lorem(rng, 25)} for i in range(1, 4)],
+            "examples": [{"description": lorem(rng, 6), "language": "python",
+                          "code": f"value = compute({i})\nprint(value)"} for i in range(1, 3)],
+            "exercises": [{"problem": lorem(rng, 15), "hint": lorem(rng, 8), "expected_outcome": lorem(rng, 8)}],
+        })
+    if json_mode:
+        return json.dumps({"result": lorem(rng, max_tokens // 2)})
+    return markdown_body(rng, max_tokens)
+
+
+def markdown_body(rng, tokens):
+    parts = []
+    used = 0
+    index = 1
+    while used < tokens:
+        paragraph = lorem(rng, 60)
+        parts.append(f"### Part {index}\n\n**Key idea**: {paragraph}\n\n- {lorem(rng, 8)}\n- {lorem(rng, 8)}\n\n"
+                     f"```python\nresult = handler({index})\nprint(result)\n```")
+        used += 100
+        index += 1
+    return "\n\n".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=300, help="Mean (median for lognormal) time to first token")
+    parser.add_argument("--latency-dist", choices=("fixed", "uniform", "exponential", "lognormal"), default="lognormal")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Lognormal sigma; larger means a longer tail")
+    parser.add_argument("--tokens-per-second", type=float, default=100, help="Generation speed; 0 returns instantly")
+    parser.add_argument("--completion-tokens", type=int, default=1200, help="Approximate length of each completion")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with an error")
+    parser.add_argument("--error-codes", default="429,500,503", help="Comma-separated HTTP statuses to inject")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Fraction of requests that stall (to exercise timeouts)")
+    parser.add_argument("--hang-seconds", type=float, default=300)
+    parser.add_argument("--stream-cut-rate", type=float, default=0.0, help="Fraction of streams dropped halfway")
+    parser.add_argument("--embedding-dim", type=int, default=1024)
+    parser.add_argument("--embed-latency-ms", type=float, default=5, help="Per-input embedding latency")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    print(f"🧪 Mock LLM/Ollama server on http://{args.host}:{args.port} "
+          f"(latency {args.latency_dist} {args.latency_ms:.0f}ms, {args.tokens_per_second:.0f} tok/s, "
+          f"error rate {args.error_rate:.0%})")
+    uvicorn.run(create_app(MockConfig(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Benchmark for ReportLab PDF exports of a large tutorial, through the path the
+app uses: agents/pdf_sections.render_tutorial_pdf renders the cover and every
+section as separate PDFs and merges them. Time and peak Python memory of the
+renderer in agents/pdf_fallback.py are compared with the section renderer it
+replaced.
+
+Usage:
+    python benchmarks/pdf_fallback.py --sections 80
+
+ReportLab is used even where WeasyPrint loads. Every run starts with an empty
+section cache, and the parts render one after another in this process (the
+app spreads them over the export pool), so the figures are the layout work.
+Peak memory is measured with tracemalloc in a second pass, since tracing slows
+everything down. Run with HIGHLIGHT_MAX_CHARS=0 to time the current renderer
+without syntax highlighting.
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import tempfile
+import contextlib
+import tracemalloc
+import concurrent.futures
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents import pdf_fallback, pdf_sections
+from agents.exporters import section_display_title
+from agents.markdown_renderer import parse_markdown, inline_reportlab, Heading, CodeBlock, ListBlock
+
+
+def legacy_build(story, output_path):
+    from reportlab.platypus import SimpleDocTemplate
+
+    SimpleDocTemplate(output_path, **pdf_fallback.page_layout()).build(story)
+
+
+def legacy_create_cover_pdf(title, sections, metadata, output_path, page_numbers=None):
+    """The cover renderer before the rework, kept here for comparison."""
+    from reportlab.platypus import Paragraph, Spacer
+    from xml.sax.saxutils import escape
+
+    styles = pdf_fallback.pdf_styles()
+    story = [
+        Paragraph(escape(title), styles["title"]),
+        Paragraph("A comprehensive, step-by-step guide to mastering every concept", styles["subtitle"]),
+        Spacer(1, 20),
+        Paragraph(escape(f"Generated: {metadata.get('generated_at', 'Unknown')} | Source: "
+                         f"{metadata.get('source_query', 'Unknown')} | Sections: {len(sections)}"), styles["normal"]),
+        Spacer(1, 30),
+        Paragraph("Table of Contents", styles["toc"]),
+    ]
+    for i, section in enumerate(sections):
+        toc_item = f"{i+1}. {escape(section_display_title(section))}"
+        if page_numbers:
+            toc_item += f" <font color='#718096'>(page {page_numbers[i]})</font>"
+        story.append(Paragraph(toc_item, styles["normal"]))
+    legacy_build(story, output_path)
+    return True
+
+
+def legacy_create_section_pdf(number, section, output_path):
+    """The section renderer before the rework: a Paragraph per list item and a Spacer per block."""
+    from reportlab.platypus import Paragraph, Preformatted, Spacer
+    from xml.sax.saxutils import escape
+
+    styles = pdf_fallback.pdf_styles()
+    story = [Paragraph(f"{number}. {escape(section_display_title(section))}", styles["section_title"]),
+             Spacer(1, 12)]
+    for block in section.get('blocks') or parse_markdown(section.get('content', '')):
+        if isinstance(block, CodeBlock):
+            if block.code.strip():
+                story.append(Preformatted(block.code, styles["code"]))
+        elif isinstance(block, Heading):
+            story.append(Paragraph(inline_reportlab(block.inlines), styles["header"]))
+        elif isinstance(block, ListBlock):
+            for item_number, item in enumerate(block.items, 1):
+                bullet = f"{item_number}." if block.ordered else "•"
+                story.append(Paragraph(f"{bullet} {inline_reportlab(item)}", styles["normal"]))
+            story.append(Spacer(1, 6))
+        else:
+            text = "<br/>".join(inline_reportlab(line) for line in block.lines)
+            if text.strip():
+                story.append(Paragraph(text, styles["normal"]))
+                story.append(Spacer(1, 6))
+    legacy_build(story, output_path)
+    return True
+
+
+# name -> (section renderer, cover renderer)
+VARIANTS = {
+    "legacy": (legacy_create_section_pdf, legacy_create_cover_pdf),
+    "current": (pdf_fallback.create_section_pdf, pdf_fallback.create_cover_pdf),
+}
+
+
+def inline_submit(fn, *args):
+    future = concurrent.futures.Future()
+    future.set_result(fn(*args))
+    return future
+
+
+@contextlib.contextmanager
+def renderer(create_section_pdf, create_cover_pdf):
+    # pdf_sections looks both functions up in agents.pdf_fallback when it renders
+    saved = pdf_fallback.create_section_pdf, pdf_fallback.create_cover_pdf
+    pdf_fallback.create_section_pdf, pdf_fallback.create_cover_pdf = create_section_pdf, create_cover_pdf
+    try:
+        yield
+    finally:
+        pdf_fallback.create_section_pdf, pdf_fallback.create_cover_pdf = saved
+
+
+def render(tutorial, tmp, name):
+    """One cold render of the whole tutorial; returns the output path."""
+    pdf_sections.SECTION_CACHE_DIR = tempfile.mkdtemp(dir=tmp)
+    path = os.path.join(tmp, f"{name}.pdf")
+    with contextlib.redirect_stdout(io.StringIO()), renderer(*VARIANTS[name]):
+        if not pdf_sections.render_tutorial_pdf(tutorial, path, inline_submit):
+            raise RuntimeError(f"{name} render failed")
+    return path
+
+
+def tutorial_sections(count, steps):
+    sections = []
+    for n in range(1, count + 1):
+        parts = []
+        for i in range(steps):
+            parts.append(f"### Step {n}.{i}\n\n"
+                         f"This step configures the **client** with `timeout={i}` and an *optional* retry policy. "
+                         "It explains why the default is safe and when to change it, with enough prose to fill "
+                         "a few lines of the page the way a generated section does.\n\n"
+                         f"- First point about step {i}\n- Second point with `code`\n- Third **important** point\n\n"
+                         f"```python\nclient = Client(timeout={n * 100 + i})\nresult = client.fetch('/items', page={i})\n"
+                         "for item in result:\n    print(item.name, item.value)\n```\n\n"
+                         f"> Note: step {i} is idempotent.")
+        sections.append({"title": f"Section {n}", "content": "\n\n".join(parts)})
+    return sections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=80)
+    parser.add_argument("--steps", type=int, default=8, help="Subsections (prose, list, code, note) per section")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant; the fastest is reported")
+    parser.add_argument("--skip-memory", action="store_true", help="Only time the variants")
+    args = parser.parse_args()
+
+    # Benchmark the ReportLab fallback even where WeasyPrint loads
+    pdf_sections._weasyprint = False
+    tutorial = {"title": "Benchmark Tutorial", "metadata": {"generated_at": "now", "source_query": "benchmark"},
+                "sections": tutorial_sections(args.sections, args.steps)}
+    warm_up = dict(tutorial, sections=tutorial["sections"][:1])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'variant':<10}{'pages':>8}{'seconds':>10}{'peak MB':>10}")
+        for name in VARIANTS:
+            # Imports and the cached styles
+            render(warm_up, tmp, name)
+            seconds = float("inf")
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                path = render(tutorial, tmp, name)
+                seconds = min(seconds, time.perf_counter() - started)
+            pages = pdf_sections.page_count(path)
+
+            peak = "skipped"
+            if not args.skip_memory:
+                tracemalloc.start()
+                render(tutorial, tmp, name)
+                peak = f"{tracemalloc.get_traced_memory()[1] / 2**20:.1f}"
+                tracemalloc.stop()
+            print(f"{name:<10}{pages:>8}{seconds:>10.2f}{peak:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Compare section generation modes: multi-call (draft + 3 enrichment calls)
+versus structured (one JSON call per section).
+
+Usage:
+    python benchmarks/section_modes.py --docs docs.md --sections 3
+
+Uses the providers configured in .env. The LLM cache is disabled unless
+LLM_CACHE is set explicitly, so both modes pay for real calls.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_CACHE", "off")
+
+from agents.graph import generate_outline, write_enhanced_section, corpus_store
+from utils.token_budget import UsageTracker
+
+MODES = ("multi", "structured")
+
+
+def run_mode(mode, state, section_keys):
+    usage = UsageTracker()
+    config = {"configurable": {"usage": usage, "section_mode": mode, "session_id": f"bench-{mode}"}}
+    latencies = []
+    for key in section_keys:
+        started = time.monotonic()
+        write_enhanced_section(dict(state, current_section_key=key), config)
+        latencies.append(time.monotonic() - started)
+    totals = usage.totals()
+    by_node = usage.by_node()
+    return {
+        "mode": mode,
+        "sections": len(section_keys),
+        "wall_seconds": round(sum(latencies), 2),
+        "seconds_per_section": round(sum(latencies) / len(latencies), 2),
+        "calls": totals["calls"],
+        "prompt_tokens": totals["prompt_tokens"],
+        "completion_tokens": totals["completion_tokens"],
+        # Structured sections that failed validation fall back to the multi-call path
+        "fallbacks": by_node.get("write_section", {}).get("calls", 0) if mode == "structured" else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", required=True, help="Text/markdown file used as the scraped documentation")
+    parser.add_argument("--query", default="Create a tutorial from this documentation")
+    parser.add_argument("--sections", type=int, default=3, help="Number of outline sections to write per mode")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    with open(args.docs, "r", encoding="utf-8") as f:
+        scraped_content = f.read()
+
+    state = {
+        "original_query": args.query,
+        "corpus_ref": corpus_store.put_pages([{"url": args.docs, "content": scraped_content}]),
+        "corpus_id": "",
+        "tutorial_outline": {},
+        "section_drafts": {},
+        "final_tutorial": "",
+        "html_content": "",
+        "error_message": "",
+        "current_section_key": "0",
+        "section_failures": {},
+        "enhanced_sections": {},
+        "code_examples": {},
+        "concept_explanations": {},
+    }
+    # Both modes write the same outline, generated once up front
+    state.update(generate_outline(state))
+    if state["error_message"]:
+        print(f"❌ {state['error_message']}")
+        sys.exit(1)
+    section_count = min(args.sections, len(state["tutorial_outline"].get("sections", [])))
+    section_keys = [str(i) for i in range(section_count)]
+
+    results = [run_mode(mode, state, section_keys) for mode in MODES]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"\n📊 Section modes over {section_count} sections")
+    print(f"{'mode':<12}{'s/section':>10}{'calls':>8}{'prompt tok':>12}{'compl tok':>11}{'fallbacks':>11}")
+    for r in results:
+        print(f"{r['mode']:<12}{r['seconds_per_section']:>10}{r['calls']:>8}"
+              f"{r['prompt_tokens']:>12}{r['completion_tokens']:>11}{r['fallbacks']:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,11 @@
 import os
+import re
+import uuid
+import datetime
 import asyncio
-from typing import Dict, Any, Optional
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, HTMLResponse
 from pydantic import BaseModel, SecretStr
@@ -9,32 +13,81 @@ from dotenv import load_dotenv
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema.output_parser import StrOutputParser
 from langchain_openai import ChatOpenAI
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 
 from utils.crawler import Crawler
 from utils.vector_store import VectorStoreManager
-from agents.graph import create_tutorial_graph, GraphState
+from utils.token_budget import UsageTracker, count_tokens
+from utils.rate_limiter import LLMScheduler
+from utils.run_index import RunIndex
+from utils.static_assets import STATIC_DIR, resolve_asset
+from utils.file_serving import IMMUTABLE, REVALIDATE, file_response, precompress
+from agents.graph import create_tutorial_graph, plan_incremental_update, GraphState, corpus_store, llm as tutorial_llm
+from agents.exporters import (TUTORIAL_DIR, ARTIFACT_FORMATS, LiveTutorialPage, live_page_path, load_tutorial, render_artifact, start_export_pool,
+                              shutdown_export_pool)
 
 load_dotenv()
 
-app = FastAPI(title="Enhanced Document to Tutorial Builder", version="2.0.0")
+# Every run is checkpointed after each graph step so it can be resumed after a restart
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", "checkpoints.sqlite")
+GRAPH_RECURSION_LIMIT = 200
+
+tutorial_graph = None
+# Run ids currently executing in this process, so one run is never driven twice
+active_runs: set = set()
+
+TUTORIAL_MEDIA_TYPES = {
+    ".html": "text/html",
+    ".pdf": "application/pdf",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".md": "text/markdown; charset=utf-8",
+}
+# /tutorial/<tutorial id>.<format>: rendered on demand from the stored tutorial
+ARTIFACT_NAME = re.compile(rf"([0-9a-f]{{16}})\.({'|'.join(ARTIFACT_FORMATS)})")
+RUN_ID = re.compile(r"[0-9a-f]{32}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global tutorial_graph
+    start_export_pool()
+    precompress(os.path.join(STATIC_DIR, "tutorial.css"))
+    async with AsyncSqliteSaver.from_conn_string(CHECKPOINT_DB) as checkpointer:
+        tutorial_graph = create_tutorial_graph(checkpointer)
+        yield
+    shutdown_export_pool()
+
+app = FastAPI(title="Enhanced Document to Tutorial Builder", version="2.0.0", lifespan=lifespan)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Initialize LLM for Q&A using DeepSeek with proper type handling
 deepseek_key = os.getenv("DEEPSEEK_API_KEY")
-if deepseek_key:
+custom_base_url = os.getenv("LLM_BASE_URL")
+if custom_base_url:
+    # Same single endpoint the tutorial generator uses
+    ask_provider = "custom"
+    llm = ChatOpenAI(
+        model=os.getenv("LLM_MODEL", "mock-model"),
+        temperature=0.1,
+        base_url=custom_base_url,
+        api_key=SecretStr(os.getenv("LLM_API_KEY", "not-needed"))
+    )
+elif deepseek_key:
+    ask_provider = "deepseek"
     llm = ChatOpenAI(
         model="deepseek-chat",
         temperature=0.1,
         api_key=SecretStr(deepseek_key)
     )
 else:
+    ask_provider = ""
     llm = None
 
 # Global instances
 vector_store_manager = VectorStoreManager()
-tutorial_graph = create_tutorial_graph()
+# Latest completed run per documentation URL, for incremental refreshes
+run_index = RunIndex.from_env()
 
 class GenerationRequest(BaseModel):
     url: str
@@ -43,24 +96,298 @@ class GenerationRequest(BaseModel):
 class QuestionRequest(BaseModel):
     query: str
 
+def coalesce_deltas(batch: List[Optional[Dict[str, Any]]]) -> List[Optional[Dict[str, Any]]]:
+    """Merge consecutive section_delta messages for the same section into one frame."""
+    merged: List[Optional[Dict[str, Any]]] = []
+    for message in batch:
+        previous = merged[-1] if merged else None
+        if (message and previous and message.get("type") == "section_delta"
+                and previous.get("type") == "section_delta"
+                and previous.get("section_key") == message.get("section_key")):
+            merged[-1] = dict(previous, delta=previous["delta"] + message["delta"])
+        else:
+            merged.append(message)
+    return merged
+
+def usage_stats(usage: UsageTracker) -> Dict[str, Any]:
+    totals = usage.totals()
+    return {
+        "llmCalls": totals["calls"],
+        "promptTokens": totals["prompt_tokens"],
+        "completionTokens": totals["completion_tokens"],
+        "llmSeconds": totals["latency"]
+    }
+
+async def forward_messages(websocket: WebSocket, outbox: asyncio.Queue):
+    """Send queued messages in order until a None sentinel arrives."""
+    while True:
+        batch = [await outbox.get()]
+        while not outbox.empty():
+            batch.append(outbox.get_nowait())
+        for message in coalesce_deltas(batch):
+            if message is None:
+                return
+            await websocket.send_json(message)
+
 @app.get("/")
 async def read_index():
     return FileResponse('static/index.html')
 
+@app.get("/assets/{name}")
+async def serve_asset(name: str, request: Request):
+    """Fingerprinted static files shared by the tutorial pages; the name changes with the content"""
+    asset = resolve_asset(name)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    path, media_type, current = asset
+    # Pages written before the asset changed still link its old name; they get the current file, revalidated
+    return await asyncio.to_thread(file_response, request, path, media_type, IMMUTABLE if current else REVALIDATE)
+
+def tutorial_html_path(filename: str) -> Optional[str]:
+    """Path of a generated tutorial page, or None unless filename names an .html file directly in TUTORIAL_DIR"""
+    if not filename.endswith('.html') or os.path.basename(filename) != filename:
+        return None
+    root = os.path.realpath(TUTORIAL_DIR)
+    path = os.path.realpath(os.path.join(root, filename))
+    if os.path.dirname(path) != root or not os.path.isfile(path):
+        return None
+    return path
+
 @app.get("/tutorial/{filename}")
-async def serve_tutorial(filename: str):
-    """Serve generated tutorial HTML files"""
-    file_path = f"generated_tutorials/{filename}"
-    if os.path.exists(file_path) and filename.endswith('.html'):
-        return FileResponse(file_path, media_type="text/html")
-    raise HTTPException(status_code=404, detail="Tutorial not found")
+async def serve_tutorial(filename: str, request: Request):
+    """Serve generated tutorial HTML files, and PDF/DOCX/Markdown renders of stored tutorials"""
+    artifact = ARTIFACT_NAME.fullmatch(filename)
+    if artifact:
+        return await serve_artifact(request, *artifact.groups())
+    file_path = tutorial_html_path(filename)
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="Tutorial not found")
+    # Pages are named <title>_<timestamp>.html and never rewritten
+    return await asyncio.to_thread(file_response, request, file_path, TUTORIAL_MEDIA_TYPES[".html"], IMMUTABLE)
+
+@app.get("/tutorial/live/{run_id}.html")
+async def serve_live_tutorial(run_id: str, request: Request):
+    """The page of a run in progress, growing as sections are written; the full tutorial once compiled"""
+    path = live_page_path(run_id)
+    if not RUN_ID.fullmatch(run_id) or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Tutorial not found")
+    return await asyncio.to_thread(file_response, request, path, TUTORIAL_MEDIA_TYPES[".html"], REVALIDATE)
+
+async def serve_artifact(request: Request, tutorial_id: str, fmt: str):
+    tutorial = load_tutorial(tutorial_id)
+    if tutorial is None:
+        raise HTTPException(status_code=404, detail="Tutorial not found")
+    # Cached on disk after the first render; concurrent requests share one render
+    path = await asyncio.wrap_future(render_artifact(tutorial_id, fmt))
+    if not path:
+        raise HTTPException(status_code=500, detail=f"Could not render the tutorial as {fmt.upper()}")
+    safe_title = "".join(c for c in tutorial["title"] if c.isalnum() or c in (' ', '-', '_')).strip() or "tutorial"
+    # The same URL serves a new render after RENDER_VERSION changes, so clients revalidate
+    return await asyncio.to_thread(file_response, request, path, TUTORIAL_MEDIA_TYPES[f".{fmt}"], REVALIDATE,
+                                   filename=f"{safe_title}.{fmt}",
+                                   content_disposition_type="inline" if fmt == "pdf" else "attachment")
+
+def run_config(run_id: str) -> Dict[str, Any]:
+    return {"configurable": {"thread_id": run_id}}
+
+async def send_tutorial_result(websocket: WebSocket, final_state: Optional[Dict[str, Any]],
+                               include_html: bool = True) -> None:
+    """The final result message; include_html=False when the client already has every section from the live page"""
+    if final_state and final_state.get("error_message"):
+        await websocket.send_json({"type": "error", "message": final_state["error_message"]})
+    elif final_state:
+        # --- 4. SEND FINAL RESULT ---
+        # Get the tutorial outline safely
+        tutorial_outline = final_state.get('tutorial_outline', {})
+        section_drafts = final_state.get('section_drafts', {})
+        failed_count = len(tutorial_outline.get('sections', [])) - len(section_drafts)
+        completion_message = "Tutorial generation complete!"
+        if failed_count > 0:
+            completion_message = f"Tutorial generation complete ({failed_count} section(s) could not be generated)"
+        await websocket.send_json({"type": "status", "agent": "tutorial", "status": "completed", "progress": 100, "message": completion_message})
+        
+        # Create a comprehensive result for the frontend
+        result_data = {
+            "title": tutorial_outline.get('title', 'Generated Tutorial'),
+            "description": "A comprehensive tutorial generated by the AI agent system.",
+            "html_content": final_state.get('html_content', '') if include_html else "",
+            "artifacts": final_state.get('artifacts', {}),
+            "sections": [
+                {
+                    "title": s.get('title', f'Section {i+1}'), 
+                    "content": section_drafts.get(str(i), ""),
+                    "failed": str(i) not in section_drafts
+                }
+                for i, s in enumerate(tutorial_outline.get('sections', []))
+            ]
+        }
+        await websocket.send_json({"type": "result", "data": result_data})
+    else:
+        await websocket.send_json({"type": "error", "message": "Tutorial generation failed: No result returned"})
+
+async def open_live_page(outbox: asyncio.Queue, live_page: LiveTutorialPage, run_id: str,
+                         state: Dict[str, Any]) -> None:
+    """Send the page shell once the outline exists, then any sections already written (resumed and refreshed runs)"""
+    metadata = {
+        "generated_at": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "source_query": state.get('original_query', 'Unknown')
+    }
+    shell = await asyncio.to_thread(live_page.open, state["tutorial_outline"], metadata)
+    await outbox.put({"type": "tutorial_shell", "run_id": run_id, "url": f"/tutorial/live/{run_id}.html", "html": shell})
+    for section_key in sorted(state.get("section_drafts") or {}, key=int):
+        await send_live_section(outbox, live_page, section_key, state["section_drafts"][section_key])
+
+async def send_live_section(outbox: asyncio.Queue, live_page: LiveTutorialPage, section_key: str, content: str) -> None:
+    fragment = await asyncio.to_thread(live_page.add_section, section_key, content)
+    if fragment:
+        await outbox.put({"type": "section_html", "section_key": section_key, "number": int(section_key) + 1,
+                          "html": fragment})
+
+async def run_tutorial_graph(websocket: WebSocket, graph_input: Optional[GraphState], run_id: str, session_id: str,
+                             section_key: str = 'unknown') -> None:
+    """Run (graph_input given) or resume (graph_input None) a checkpointed run and send its result."""
+    if run_id in active_runs:
+        await websocket.send_json({"type": "error", "message": f"Run {run_id} is already in progress."})
+        return
+    active_runs.add(run_id)
+    await websocket.send_json({"type": "run_started", "run_id": run_id, "resumed": graph_input is None})
+    try:
+        # Graph nodes run on worker threads; everything they emit (e.g. streamed
+        # section_delta tokens) goes through one queue so frames stay ordered
+        loop = asyncio.get_running_loop()
+        outbox: asyncio.Queue = asyncio.Queue()
+        forwarder = asyncio.create_task(forward_messages(websocket, outbox))
+        usage = UsageTracker()
+        # Sections are shown, and written to the live page, as soon as each one is finished
+        live_page = LiveTutorialPage(run_id)
+        initial_state = graph_input or (await tutorial_graph.aget_state(run_config(run_id))).values
+        if initial_state.get("tutorial_outline"):
+            await open_live_page(outbox, live_page, run_id, initial_state)
+        graph_config = {
+            "configurable": {
+                "thread_id": run_id,
+                "emit": lambda message: loop.call_soon_threadsafe(outbox.put_nowait, message),
+                "vector_store": vector_store_manager,
+                "usage": usage,
+                "session_id": session_id
+            },
+            "recursion_limit": GRAPH_RECURSION_LIMIT
+        }
+
+        # Stream LangGraph progress
+        try:
+            final_state: Optional[Dict[str, Any]] = None
+            # "updates" carries each node's partial result for progress messages,
+            # "values" the merged state, the last of which is the final state
+            async for mode, chunk in tutorial_graph.astream(graph_input, config=graph_config,
+                                                            stream_mode=["updates", "values"]):
+                if mode == "values":
+                    final_state = chunk
+                    continue
+                for key, value in chunk.items():
+                    if key == 'summarize_corpus':
+                        await outbox.put({"type": "status", "agent": "structure", "status": "working", "progress": 20, "message": "Documentation digested, planning outline..."})
+                    elif key == 'generate_outline':
+                        await outbox.put({"type": "status", "agent": "structure", "status": "working", "progress": 25, "message": "Generating tutorial outline..."})
+                        if (value or {}).get('tutorial_outline'):
+                            await open_live_page(outbox, live_page, run_id, {**initial_state, **value})
+                    elif key == 'get_next_section_key':
+                        section_key = (value or {}).get('current_section_key', 'unknown')
+                    elif key == 'write_section':
+                        await outbox.put({"type": "status", "agent": "tutorial", "status": "working", "progress": 50, "message": f"Writing section: {section_key}"})
+                        for written_key, content in ((value or {}).get('section_drafts') or {}).items():
+                            await send_live_section(outbox, live_page, written_key, content)
+                    elif key == 'compile_tutorial':
+                        await outbox.put({"type": "status", "agent": "tutorial", "status": "working", "progress": 90, "message": "Compiling final tutorial..."})
+                    await outbox.put({"type": "stats_update", "stats": usage_stats(usage)})
+            
+            # Fallback if final_state is not captured
+            if not final_state:
+                final_state = (await tutorial_graph.aget_state(run_config(run_id))).values
+        except Exception as e:
+            print(f"Error in tutorial generation (run {run_id}): {e}")
+            await outbox.put({"type": "error", "message": f"Tutorial generation failed: {str(e)}. Run {run_id} can be resumed."})
+            return
+        finally:
+            print(usage.summary())
+            await outbox.put(None)
+            await forwarder
+
+        if final_state and not final_state.get("error_message") and final_state.get("source_url"):
+            released = run_index.record(final_state["source_url"], run_id, final_state.get("corpus_ref", ""))
+            if released:
+                # No tutorial retrieves from that crawl any more
+                await asyncio.to_thread(vector_store_manager.delete_corpus, released[:16])
+        if final_state and final_state.get("html_content"):
+            await asyncio.to_thread(live_page.finish, final_state["html_content"])
+        # A client that received every section already shows the whole tutorial
+        await send_tutorial_result(websocket, final_state, include_html=not live_page.complete)
+    finally:
+        active_runs.discard(run_id)
+
+async def previous_run(source_url: str) -> Optional[tuple]:
+    """(run_id, final state) of the last completed run for source_url, if its checkpoint is still there."""
+    entry = run_index.get(source_url)
+    if not entry:
+        return None
+    snapshot = await tutorial_graph.aget_state(run_config(entry["run_id"]))
+    if not snapshot.values or snapshot.next or snapshot.values.get("error_message"):
+        return None
+    return entry["run_id"], snapshot.values
+
+async def resume_tutorial_run(websocket: WebSocket, run_id: str, session_id: str) -> None:
+    """Continue a checkpointed run from its last completed step; finished runs just resend their result."""
+    snapshot = await tutorial_graph.aget_state(run_config(run_id))
+    if not snapshot.values:
+        await websocket.send_json({"type": "error", "message": f"No saved run with id {run_id}.", "resumable": False})
+        return
+    if not snapshot.next:
+        await websocket.send_json({"type": "run_started", "run_id": run_id, "resumed": True})
+        await send_tutorial_result(websocket, snapshot.values)
+        return
+    
+    sections = snapshot.values.get("tutorial_outline", {}).get("sections", [])
+    written = len(snapshot.values.get("section_drafts", {}))
+    await websocket.send_json({"type": "status", "agent": "tutorial", "status": "working", "progress": 50,
+                               "message": f"Resuming run: {written} of {len(sections)} sections already written"})
+    await websocket.send_json({"type": "stats_update", "stats": {"sectionsCreated": written}})
+    await run_tutorial_graph(websocket, None, run_id, session_id,
+                             snapshot.values.get("current_section_key", "unknown"))
+
+@app.get("/runs/{run_id}")
+async def run_status(run_id: str):
+    """Progress of a checkpointed run, for deciding whether to resume it."""
+    snapshot = await tutorial_graph.aget_state(run_config(run_id))
+    if not snapshot.values:
+        raise HTTPException(status_code=404, detail="Run not found")
+    values = snapshot.values
+    if run_id in active_runs:
+        status = "running"
+    elif snapshot.next:
+        status = "interrupted"
+    else:
+        status = "failed" if values.get("error_message") else "completed"
+    return {
+        "run_id": run_id,
+        "status": status,
+        "next": list(snapshot.next),
+        "title": values.get("tutorial_outline", {}).get("title", ""),
+        "sections_total": len(values.get("tutorial_outline", {}).get("sections", [])),
+        "sections_written": len(values.get("section_drafts", {})),
+        "error": values.get("error_message", "")
+    }
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
+    # LLM requests are queued fairly across connections by this id
+    session_id = uuid.uuid4().hex
     try:
         while True:
             data = await websocket.receive_json()
+            if data.get("resume"):
+                await resume_tutorial_run(websocket, str(data["resume"]), session_id)
+                continue
             url = data.get("url")
             depth = int(data.get("depth", 2))
 
@@ -88,77 +415,63 @@ async def websocket_endpoint(websocket: WebSocket):
                 await websocket.send_json({"type": "error", "message": "Could not find any content to process."})
                 continue
             
+            # The crawl is written once to the corpus store; graph state only carries its reference
+            corpus_ref = await asyncio.to_thread(corpus_store.put_pages, all_pages)
+            # Sections retrieve their context from this crawl's chunks only
+            corpus_id = corpus_ref[:16]
+
+            previous = await previous_run(url)
+            if previous and previous[1].get("corpus_ref") == corpus_ref:
+                # Nothing changed since the last run: no embedding, no LLM calls
+                previous_run_id, previous_state = previous
+                await websocket.send_json({"type": "status", "agent": "analysis", "status": "completed", "progress": 100, "message": "Documentation unchanged since the last run, reusing that tutorial."})
+                await websocket.send_json({"type": "run_started", "run_id": previous_run_id, "resumed": True})
+                await send_tutorial_result(websocket, previous_state)
+                continue
+
             # --- 2. VECTOR STORE UPSERT ---
             await websocket.send_json({"type": "status", "agent": "analysis", "status": "working", "progress": 10, "message": "Embedding and storing content..."})
-            docs_upserted = vector_store_manager.upsert_documents(all_pages)
+            # A recrawl only embeds the chunks that are not already stored for the previous crawl
+            docs_upserted = await asyncio.to_thread(vector_store_manager.upsert_documents, all_pages, corpus_id,
+                                                    previous[1].get("corpus_id") if previous else None)
             await websocket.send_json({"type": "status", "agent": "analysis", "status": "completed", "progress": 100, "message": f"Stored {docs_upserted} document chunks."})
+            # Nodes read pages back from the corpus store, so drop the in-memory copy
+            all_pages = []
 
             # --- 3. LANGGRAPH TUTORIAL GENERATION ---
-            full_content = "\n\n---\n\n".join([f"Source URL: {p['url']}\n\n{p['content']}" for p in all_pages])
-            
+            if previous:
+                # Recrawl of a finished tutorial: keep the outline and every section whose sources are unchanged
+                initial_state, changed = await asyncio.to_thread(
+                    plan_incremental_update, previous[1], corpus_ref, corpus_id if docs_upserted else "",
+                    {"configurable": {"vector_store": vector_store_manager}}
+                )
+                total = len(initial_state["tutorial_outline"].get("sections", []))
+                await websocket.send_json({"type": "status", "agent": "structure", "status": "completed", "progress": 100, "message": f"Documentation changed: regenerating {len(changed)} of {total} sections."})
+                await websocket.send_json({"type": "stats_update", "stats": {"sectionsCreated": total - len(changed)}})
+                await run_tutorial_graph(websocket, initial_state, uuid.uuid4().hex, session_id)
+                continue
+
             # Create properly typed initial state
             initial_state: GraphState = {
                 "original_query": f"Create a comprehensive tutorial from the documentation at {url}",
-                "scraped_content": full_content,
+                "source_url": url,
+                "corpus_ref": corpus_ref,
+                "corpus_id": corpus_id if docs_upserted else "",
                 "tutorial_outline": {},
                 "section_drafts": {},
+                "section_sources": {},
                 "final_tutorial": "",
                 "html_content": "",
                 "error_message": "",
                 "current_section_key": "0",
+                "section_failures": {},
                 "enhanced_sections": {},
                 "code_examples": {},
                 "concept_explanations": {}
             }
 
-            # Stream LangGraph progress
-            try:
-                final_state: Optional[GraphState] = None
-                async for event in tutorial_graph.astream(initial_state):
-                    for key, value in event.items():
-                        if key == 'generate_outline':
-                            await websocket.send_json({"type": "status", "agent": "structure", "status": "working", "progress": 25, "message": "Generating tutorial outline..."})
-                        elif key == 'write_section':
-                            section_key = value.get('current_section_key', 'unknown') if value else 'unknown'
-                            await websocket.send_json({"type": "status", "agent": "tutorial", "status": "working", "progress": 50, "message": f"Writing section: {section_key}"})
-                        elif key == 'compile_tutorial':
-                            await websocket.send_json({"type": "status", "agent": "tutorial", "status": "working", "progress": 90, "message": "Compiling final tutorial..."})
-                            final_state = value
-                
-                # Fallback if final_state is not captured
-                if not final_state:
-                    final_state = tutorial_graph.invoke(initial_state)
-            except Exception as e:
-                print(f"Error in tutorial generation: {e}")
-                await websocket.send_json({"type": "error", "message": f"Tutorial generation failed: {str(e)}"})
-                continue
-
-            if final_state and final_state.get("error_message"):
-                await websocket.send_json({"type": "error", "message": final_state["error_message"]})
-            elif final_state:
-                # --- 4. SEND FINAL RESULT ---
-                await websocket.send_json({"type": "status", "agent": "tutorial", "status": "completed", "progress": 100, "message": "Tutorial generation complete!"})
-                
-                # Get the tutorial outline safely
-                tutorial_outline = final_state.get('tutorial_outline', {})
-                section_drafts = final_state.get('section_drafts', {})
-                
-                # Create a comprehensive result for the frontend
-                result_data = {
-                    "title": tutorial_outline.get('title', 'Generated Tutorial'),
-                    "description": "A comprehensive tutorial generated by the AI agent system.",
-                    "html_content": final_state.get('html_content', ''),
-                    "sections": [
-                        {
-                            "title": s.get('title', f'Section {i+1}'), 
-                            "content": section_drafts.get(str(i), "")
-                        }
-                        for i, s in enumerate(tutorial_outline.get('sections', []))
-                    ]
-                }
-                await websocket.send_json({"type": "result", "data": result_data})
-            else:
-                await websocket.send_json({"type": "error", "message": "Tutorial generation failed: No result returned"})
+            run_id = uuid.uuid4().hex
+            await run_tutorial_graph(websocket, initial_state, run_id, session_id)
 
     except WebSocketDisconnect:
         print("Client disconnected")
@@ -195,7 +508,15 @@ async def ask_question(request: QuestionRequest):
             Answer:"""
         )
         chain = prompt | llm | StrOutputParser()
-        answer = await chain.ainvoke({"context": context, "question": request.query})
+        # Interactive questions jump ahead of queued bulk section writing
+        ticket = await asyncio.to_thread(
+            tutorial_llm.scheduler.acquire, LLMScheduler.INTERACTIVE, "ask", ask_provider,
+            count_tokens(context) + count_tokens(request.query) + 1000
+        )
+        try:
+            answer = await chain.ainvoke({"context": context, "question": request.query})
+        finally:
+            tutorial_llm.scheduler.release(ticket)
         
         # Get unique source URLs
         sources = list(set([doc['metadata']['source_url'] for doc in context_docs if 'metadata' in doc and 'source_url' in doc['metadata']]))
@@ -206,4 +527,5 @@ async def ask_question(request: QuestionRequest):
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "version": "2.0.0"}
\ No newline at end of file
+    return {"status": "healthy", "version": "2.0.0", "llm_providers": tutorial_llm.provider_status(),
+            "llm_scheduler": tutorial_llm.scheduler.snapshot()}
\ No newline at end of file
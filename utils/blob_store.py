@@ -0,0 +1,81 @@
+import os
+import gzip
+import json
+import hashlib
+import threading
+
+PAGE_SEPARATOR = "\n\n---\n\n"
+
+
+def format_page(page):
+    """How a crawled page appears in prompt context."""
+    return f"Source URL: {page['url']}\n\n{page['content']}"
+
+
+class CorpusStore:
+    """Content-addressed, gzip-compressed store for crawled corpora.
+
+    A corpus is written once as gzipped JSON lines (one page per line) under
+    the SHA-256 of its contents; identical crawls share one file. Graph state
+    keeps only the returned reference and reads pages back lazily.
+    """
+
+    def __init__(self, root="corpus_store"):
+        self.root = root
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.getenv("CORPUS_STORE_DIR", "corpus_store"))
+
+    def _path(self, ref):
+        return os.path.join(self.root, ref[:2], f"{ref}.jsonl.gz")
+
+    def exists(self, ref):
+        return bool(ref) and os.path.exists(self._path(ref))
+
+    def put_pages(self, pages):
+        """Store an iterable of {"url", "content"} pages; returns the corpus reference."""
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f".incoming.{os.getpid()}.{threading.get_ident()}.tmp")
+        digest = hashlib.sha256()
+        try:
+            with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+                for page in pages:
+                    line = json.dumps({"url": page["url"], "content": page["content"]},
+                                      ensure_ascii=False, sort_keys=True).encode("utf-8") + b"\n"
+                    digest.update(line)
+                    f.write(line)
+            ref = digest.hexdigest()
+            path = self._path(ref)
+            if os.path.exists(path):
+                # Same corpus already stored
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            return ref
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def iter_pages(self, ref):
+        """Yield the stored pages one at a time, decompressing as it goes."""
+        with gzip.open(self._path(ref), "rt", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def read_text(self, ref, max_chars=None):
+        """The corpus as prompt text (pages joined by PAGE_SEPARATOR), stopping after max_chars."""
+        parts = []
+        size = 0
+        for page in self.iter_pages(ref):
+            text = format_page(page)
+            if parts:
+                text = PAGE_SEPARATOR + text
+            if max_chars is not None and size + len(text) >= max_chars:
+                parts.append(text[:max_chars - size])
+                break
+            parts.append(text)
+            size += len(text)
+        return "".join(parts)
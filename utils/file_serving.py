@@ -0,0 +1,128 @@
+import os
+import gzip
+import hashlib
+from functools import lru_cache
+from typing import Optional
+
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is in requirements.txt
+    brotli = None
+
+# Text formats worth compressing; PDF and DOCX are compressed already
+COMPRESSIBLE = {".html", ".md", ".css", ".js", ".json", ".txt"}
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# Timestamped or content-addressed files never change under the same name
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Files whose content can change under the same name; revalidated with the ETag
+REVALIDATE = "no-cache"
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def precompress(path):
+    """Write .br and .gz copies next to path, once, so they are never compressed per request.
+
+    Best effort: if it fails the file is just served uncompressed.
+    """
+    if os.path.splitext(path)[1].lower() not in COMPRESSIBLE:
+        return
+    try:
+        mtime = os.path.getmtime(path)
+        with open(path, "rb") as f:
+            data = f.read()
+        for encoding, suffix in ENCODINGS:
+            variant = path + suffix
+            if os.path.exists(variant) and os.path.getmtime(variant) >= mtime:
+                continue
+            if encoding == "br":
+                if brotli is None:
+                    continue
+                _write_atomic(variant, brotli.compress(data, mode=brotli.MODE_TEXT))
+            else:
+                # mtime=0 keeps the output, and so its ETag, the same for the same input
+                _write_atomic(variant, gzip.compress(data, compresslevel=9, mtime=0))
+    except OSError as e:
+        print(f"⚠️  Could not precompress {os.path.basename(path)}: {e}")
+
+
+@lru_cache(maxsize=1024)
+def _content_hash(path, mtime_ns, size):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+
+def strong_etag(path, stat_result=None):
+    """Quoted strong ETag from the file's content; hashed once per file version."""
+    stat_result = stat_result or os.stat(path)
+    return f'"{_content_hash(path, stat_result.st_mtime_ns, stat_result.st_size)}"'
+
+
+def accepted_encodings(header):
+    """Content codings the client accepts (q > 0) from an Accept-Encoding header."""
+    accepted = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def etag_matches(header, etag):
+    """If-None-Match comparison; weak comparison, as RFC 9110 requires for it."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
+
+
+def file_response(request: Request, path: str, media_type: str, cache_control: str,
+                  filename: Optional[str] = None, content_disposition_type: str = "attachment") -> Response:
+    """Serve path with a strong ETag, 304 revalidation and a precompressed copy when the client accepts one.
+
+    Range requests (resuming or paging through a large PDF) are answered by
+    FileResponse from the uncompressed file, honouring If-Range against the ETag.
+    Blocking (stat and, once per file version, hashing); call it from a thread.
+    """
+    headers = {"Cache-Control": cache_control}
+    serve_path = path
+    if os.path.splitext(path)[1].lower() in COMPRESSIBLE:
+        headers["Vary"] = "Accept-Encoding"
+        if "range" not in request.headers:
+            accepted = accepted_encodings(request.headers.get("accept-encoding"))
+            source_mtime = os.path.getmtime(path)
+            for encoding, suffix in ENCODINGS:
+                variant = path + suffix
+                if (encoding in accepted or "*" in accepted) and os.path.exists(variant) \
+                        and os.path.getmtime(variant) >= source_mtime:
+                    serve_path = variant
+                    headers["Content-Encoding"] = encoding
+                    break
+
+    stat_result = os.stat(serve_path)
+    headers["ETag"] = strong_etag(serve_path, stat_result)
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=304, headers=headers)
+    return FileResponse(serve_path, media_type=media_type, headers=headers, stat_result=stat_result,
+                        filename=filename, content_disposition_type=content_disposition_type)
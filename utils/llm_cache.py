@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+
+class CacheMissError(LookupError):
+    """Raised in replay mode when a prompt has no recorded response."""
+
+
+class LLMCache:
+    """On-disk prompt/response cache for LLM calls.
+
+    Modes:
+      - "off":       never read or write
+      - "readwrite": serve hits, record every successful response
+      - "replay":    serve hits only, raise CacheMissError on a miss (no network)
+    """
+
+    MODES = ("off", "readwrite", "replay")
+
+    def __init__(self, cache_dir="llm_cache", mode="readwrite", ttl_seconds=7 * 24 * 3600,
+                 max_entries=5000, max_bytes=500 * 1024 * 1024):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown LLM cache mode '{mode}', expected one of {self.MODES}")
+        self.cache_dir = cache_dir
+        self.mode = mode
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> (size in bytes, last access time); loaded lazily from disk
+        self._index = None
+        self._total_bytes = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            cache_dir=os.getenv("LLM_CACHE_DIR", "llm_cache"),
+            mode=os.getenv("LLM_CACHE", "readwrite").lower(),
+            ttl_seconds=float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600))),
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000")),
+            max_bytes=int(os.getenv("LLM_CACHE_MAX_MB", "500")) * 1024 * 1024,
+        )
+
+    @property
+    def enabled(self):
+        return self.mode != "off"
+
+    @property
+    def replay(self):
+        return self.mode == "replay"
+
+    @staticmethod
+    def make_key(provider, model, temperature, system_prompt, prompt):
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        material = json.dumps([provider, model, temperature, system_prompt, prompt_hash])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+        self._index = {}
+        self._total_bytes = 0
+        if not os.path.isdir(self.cache_dir):
+            return
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                self._index[name[:-5]] = (stat.st_size, stat.st_mtime)
+                self._total_bytes += stat.st_size
+
+    def _drop(self, key):
+        size, _ = self._index.pop(key, (0, 0))
+        self._total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def get(self, key):
+        """Return the cached response for key, or None. Raises CacheMissError in replay mode."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._load_index()
+            entry = None
+            if key in self._index:
+                try:
+                    with open(self._path(key), "r", encoding="utf-8") as f:
+                        entry = json.load(f)
+                except (OSError, ValueError):
+                    self._drop(key)
+            # Replays must be deterministic, so expired entries are still served there
+            if entry and not self.replay and time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                if self.replay:
+                    raise CacheMissError(f"No recorded LLM response for key {key[:12]}... (replay mode)")
+                return None
+            # Bump the access time so eviction is least-recently-used
+            now = time.time()
+            self._index[key] = (self._index[key][0], now)
+            try:
+                os.utime(self._path(key), (now, now))
+            except OSError:
+                pass
+            return entry["response"]
+
+    def set(self, key, response, **metadata):
+        if self.mode != "readwrite":
+            return
+        entry = dict(metadata, created_at=time.time(), response=response)
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        path = self._path(key)
+        with self._lock:
+            self._load_index()
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"⚠️  Could not write LLM cache entry: {e}")
+                return
+            old_size, _ = self._index.get(key, (0, 0))
+            self._index[key] = (len(data), time.time())
+            self._total_bytes += len(data) - old_size
+            self._evict()
+
+    def _evict(self):
+        if len(self._index) <= self.max_entries and self._total_bytes <= self.max_bytes:
+            return
+        # Oldest access first
+        for key, _ in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if len(self._index) <= self.max_entries and self._total_bytes <= self.max_bytes:
+                break
+            self._drop(key)
@@ -0,0 +1,104 @@
+import time
+import threading
+from collections import deque
+
+
+class ProviderHealth:
+    """Latency/error bookkeeping and circuit breaker for one LLM provider.
+
+    The breaker opens after `failure_threshold` consecutive failures and stays
+    open for `cooldown` seconds (doubling on every re-trip, up to `max_cooldown`).
+    Once the cooldown expires a single trial request is let through (half-open);
+    its outcome closes or re-opens the breaker.
+    """
+
+    # Latency assumed for a provider we have no samples for yet
+    PRIOR_LATENCY = 10.0
+    EWMA_ALPHA = 0.2
+
+    def __init__(self, name, failure_threshold=3, cooldown=30.0, max_cooldown=300.0, window=50):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.latency_ewma = None
+        self.error_ewma = 0.0
+        self.consecutive_failures = 0
+        self.cooldown = cooldown
+        self.open_until = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        if self.open_until == 0.0:
+            return "closed"
+        if time.monotonic() < self.open_until:
+            return "open"
+        return "half_open"
+
+    def allow_request(self):
+        """Whether a request may be sent now. Reserves the single half-open trial slot."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def release_trial(self):
+        """Give back the half-open trial slot when a request was allowed but never sent."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma += self.EWMA_ALPHA * (latency - self.latency_ewma)
+            self.error_ewma *= (1 - self.EWMA_ALPHA)
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+            self.cooldown = self.base_cooldown
+            self._trial_in_flight = False
+
+    def record_failure(self, trip=False):
+        """Count a failed request. trip=True opens the breaker immediately (e.g. bad credentials)."""
+        with self._lock:
+            self.error_ewma += self.EWMA_ALPHA * (1 - self.error_ewma)
+            self.consecutive_failures += 1
+            was_trial = self._trial_in_flight
+            self._trial_in_flight = False
+            if trip or was_trial or self.consecutive_failures >= self.failure_threshold:
+                if self.open_until:
+                    # Re-tripping after a failed trial backs off further
+                    self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                self.open_until = time.monotonic() + self.cooldown
+                print(f"⚠️  Circuit open for {self.name} for {self.cooldown:.0f}s")
+
+    def latency_percentile(self, percentile, min_samples=10):
+        """Latency at the given percentile (0-100), or None with too few samples."""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < min_samples:
+            return None
+        index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def score(self, preference=0):
+        """Lower is better: expected latency inflated by recent errors and preference order."""
+        latency = self.latency_ewma if self.latency_ewma is not None else self.PRIOR_LATENCY
+        return latency * (1 + 4 * self.error_ewma) * (1 + 0.25 * preference)
+
+    def snapshot(self):
+        return {
+            "state": self.state,
+            "latency_ewma": round(self.latency_ewma, 2) if self.latency_ewma is not None else None,
+            "error_rate": round(self.error_ewma, 3),
+            "p95": self.latency_percentile(95),
+        }
@@ -0,0 +1,180 @@
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+
+class TokenBucket:
+    """Classic token bucket. A rate of 0 means unlimited. Not thread-safe on its own."""
+
+    def __init__(self, rate_per_second, capacity):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self):
+        return not self.rate
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount):
+        """Seconds until `amount` tokens are available (0 if they are now)."""
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        # A request larger than the bucket would never fit; let it drain the bucket instead
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        """Take tokens; returns how many were actually charged."""
+        if self.unlimited:
+            return 0
+        self._refill()
+        amount = min(amount, self.capacity)
+        self.tokens -= amount
+        return amount
+
+    def adjust(self, delta):
+        """Charge (positive) or refund (negative) tokens after the fact; may leave the bucket in debt."""
+        if self.unlimited:
+            return
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class _Ticket:
+    __slots__ = ("priority", "session", "provider", "tokens", "actual_tokens")
+
+    def __init__(self, priority, session, provider, tokens):
+        self.priority = priority
+        self.session = session
+        self.provider = provider
+        self.tokens = tokens
+        # Set by the caller once the real usage is known
+        self.actual_tokens = None
+
+
+class LLMScheduler:
+    """Process-wide admission control for LLM requests.
+
+    Enforces a global concurrency cap plus per-provider request-per-minute and
+    token-per-minute budgets. Waiting requests are served strictly by priority
+    (INTERACTIVE before BULK) and round-robin across sessions within a priority,
+    so one large generation cannot starve other users.
+    """
+
+    INTERACTIVE = 0
+    BULK = 1
+    # Buckets hold this many seconds' worth of budget, which bounds bursts
+    BURST_SECONDS = 10
+
+    def __init__(self, max_concurrency=8, requests_per_minute=0, tokens_per_minute=0, provider_limits=None):
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        # provider -> (rpm, tpm) overrides
+        self.provider_limits = provider_limits or {}
+        self._cond = threading.Condition()
+        self._active = 0
+        self._queues = {self.INTERACTIVE: OrderedDict(), self.BULK: OrderedDict()}
+        self._buckets = {}
+
+    @classmethod
+    def from_env(cls, providers=()):
+        provider_limits = {}
+        for provider in providers:
+            rpm = os.getenv(f"LLM_RPM_{provider.upper()}")
+            tpm = os.getenv(f"LLM_TPM_{provider.upper()}")
+            if rpm or tpm:
+                provider_limits[provider] = (
+                    float(rpm) if rpm else float(os.getenv("LLM_RPM", "120")),
+                    float(tpm) if tpm else float(os.getenv("LLM_TPM", "0")),
+                )
+        return cls(
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+            requests_per_minute=float(os.getenv("LLM_RPM", "120")),
+            tokens_per_minute=float(os.getenv("LLM_TPM", "0")),
+            provider_limits=provider_limits,
+        )
+
+    def _provider_buckets(self, provider):
+        if provider not in self._buckets:
+            rpm, tpm = self.provider_limits.get(provider, (self.requests_per_minute, self.tokens_per_minute))
+            self._buckets[provider] = (
+                TokenBucket(rpm / 60, max(1.0, rpm / 60 * self.BURST_SECONDS)),
+                TokenBucket(tpm / 60, max(1.0, tpm / 60 * self.BURST_SECONDS)),
+            )
+        return self._buckets[provider]
+
+    def _head(self):
+        for priority in sorted(self._queues):
+            sessions = self._queues[priority]
+            if sessions:
+                return next(iter(sessions.values()))[0]
+        return None
+
+    def _dequeue(self, ticket):
+        sessions = self._queues[ticket.priority]
+        waiting = sessions.pop(ticket.session)
+        waiting.popleft()
+        # Re-append at the back so the next request comes from another session
+        if waiting:
+            sessions[ticket.session] = waiting
+
+    def acquire(self, priority=BULK, session="default", provider="default", tokens=0):
+        """Block until the request may be sent. Returns a ticket to pass to release()."""
+        ticket = _Ticket(priority, session or "default", provider, tokens)
+        with self._cond:
+            self._queues[priority].setdefault(ticket.session, deque()).append(ticket)
+            while True:
+                timeout = None
+                if self._head() is ticket and self._active < self.max_concurrency:
+                    requests, token_budget = self._provider_buckets(provider)
+                    wait = max(requests.time_until(1), token_budget.time_until(tokens))
+                    if wait == 0:
+                        requests.consume(1)
+                        # Remember what was charged so release() reconciles against it
+                        ticket.tokens = token_budget.consume(tokens)
+                        self._dequeue(ticket)
+                        self._active += 1
+                        self._cond.notify_all()
+                        return ticket
+                    timeout = wait
+                self._cond.wait(timeout)
+
+    def release(self, ticket, actual_tokens=None):
+        """Free the concurrency slot; reconcile the token estimate with the real usage if known."""
+        with self._cond:
+            self._active -= 1
+            if actual_tokens is not None:
+                _, token_budget = self._provider_buckets(ticket.provider)
+                token_budget.adjust(actual_tokens - ticket.tokens)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority=BULK, session="default", provider="default", tokens=0):
+        ticket = self.acquire(priority, session, provider, tokens)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket, ticket.actual_tokens)
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "active": self._active,
+                "max_concurrency": self.max_concurrency,
+                "waiting": {
+                    "interactive": sum(len(q) for q in self._queues[self.INTERACTIVE].values()),
+                    "bulk": sum(len(q) for q in self._queues[self.BULK].values()),
+                },
+            }
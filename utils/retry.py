@@ -0,0 +1,67 @@
+import random
+import threading
+
+import httpx
+import openai
+
+# Statuses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429}
+
+
+def is_retryable(exc):
+    """Whether an LLM call that raised exc may succeed if simply sent again."""
+    if isinstance(exc, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in RETRYABLE_STATUS_CODES or exc.status_code >= 500
+    # Transport errors raised while iterating a stream are not wrapped by the client
+    return isinstance(exc, (httpx.TransportError, TimeoutError, ConnectionError))
+
+
+def retry_after_seconds(exc):
+    """The server's Retry-After hint in seconds, if the error carries one."""
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        # HTTP-date form; not worth parsing, the backoff covers it
+        return None
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class RetryBudget:
+    """Caps retries at a fraction of request volume so an outage is not amplified.
+
+    Every request deposits `ratio` retries into the budget (up to `reserve`),
+    every retry withdraws one. The budget starts full so a quiet process can
+    still retry a few isolated failures.
+    """
+
+    def __init__(self, ratio=0.2, reserve=10):
+        self.ratio = ratio
+        self.reserve = reserve
+        self._balance = float(reserve)
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self._balance = min(self.reserve, self._balance + self.ratio)
+
+    def try_spend(self):
+        """Withdraw one retry; False when the budget is exhausted."""
+        with self._lock:
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+    @property
+    def balance(self):
+        return self._balance
@@ -0,0 +1,50 @@
+import os
+import json
+import time
+import threading
+
+
+class RunIndex:
+    """Maps a documentation URL to its latest completed tutorial run.
+
+    A small JSON file next to the checkpoint database; the runs themselves
+    (outline, drafts, section sources) live in the checkpoints.
+    """
+
+    def __init__(self, path="tutorial_runs.json"):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.getenv("RUN_INDEX_PATH", "tutorial_runs.json"))
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, source_url):
+        with self._lock:
+            return self._load().get(source_url)
+
+    def record(self, source_url, run_id, corpus_ref):
+        """Make run_id the latest run for source_url. Returns the corpus_ref it
+        replaces when no URL refers to that crawl any more, else None."""
+        with self._lock:
+            index = self._load()
+            replaced = (index.get(source_url) or {}).get("corpus_ref")
+            index[source_url] = {"run_id": run_id, "corpus_ref": corpus_ref, "completed_at": time.time()}
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(index, f, indent=2)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"⚠️  Could not update run index: {e}")
+                return None
+            if replaced and all(entry.get("corpus_ref") != replaced for entry in index.values()):
+                return replaced
+            return None
@@ -0,0 +1,44 @@
+import os
+import re
+import hashlib
+import mimetypes
+from functools import lru_cache
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+FINGERPRINT = re.compile(r"[0-9a-f]{12}")
+
+
+@lru_cache(maxsize=None)
+def fingerprint(filename):
+    """Short content hash of a file in static/, computed once per process."""
+    with open(os.path.join(STATIC_DIR, filename), "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def asset_url(filename):
+    """URL of a static file with its content hash in the name, so it can be cached forever."""
+    stem, ext = os.path.splitext(filename)
+    return f"/assets/{stem}.{fingerprint(filename)}{ext}"
+
+
+def resolve_asset(name):
+    """(path, media type, current) for a fingerprinted asset name, or None if no such file.
+
+    Stored tutorial pages keep the URL of the stylesheet they were written
+    with, so an older digest is still answered, with the current file;
+    current is False then, and the response must not be cached as immutable.
+    """
+    parts = name.rsplit(".", 2)
+    if len(parts) != 3:
+        return None
+    stem, digest, ext = parts
+    filename = f"{stem}.{ext}"
+    path = os.path.join(STATIC_DIR, filename)
+    if os.path.basename(filename) != filename or not os.path.isfile(path) or not FINGERPRINT.fullmatch(digest):
+        return None
+    return path, mimetypes.guess_type(filename)[0] or "application/octet-stream", fingerprint(filename) == digest
+
+
+def read_asset(filename):
+    with open(os.path.join(STATIC_DIR, filename), "r", encoding="utf-8") as f:
+        return f.read()
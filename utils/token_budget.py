@@ -0,0 +1,141 @@
+import threading
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken is in requirements.txt
+    tiktoken = None
+
+# Context window (prompt + completion) per model, in tokens
+CONTEXT_WINDOWS = {
+    "gemini-2.0-flash": 1_048_576,
+    "grok-2-1212": 131_072,
+    "deepseek-chat": 65_536,
+}
+DEFAULT_CONTEXT_WINDOW = 32_768
+SAFETY_MARGIN_TOKENS = 512
+APPROX_CHARS_PER_TOKEN = 4
+# Upper bound on characters per token, used to avoid encoding a whole corpus
+# just to keep its first few thousand tokens
+MAX_CHARS_PER_TOKEN = 10
+
+
+@lru_cache(maxsize=None)
+def _default_encoding():
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"⚠️  tiktoken encoding unavailable, approximating token counts: {str(e)[:100]}")
+        return None
+
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Non-OpenAI models: cl100k_base is a close enough proxy for budgeting
+        return _default_encoding()
+    except Exception:
+        return _default_encoding()
+
+
+def context_window(model):
+    return CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+
+def count_tokens(text, model=""):
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + APPROX_CHARS_PER_TOKEN - 1) // APPROX_CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text, max_tokens, model=""):
+    """Return the longest prefix of text that fits in max_tokens."""
+    if not text or max_tokens <= 0:
+        return ""
+    text = text[:max_tokens * MAX_CHARS_PER_TOKEN]
+    encoding = _encoding(model)
+    if encoding is None:
+        return text[:max_tokens * APPROX_CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def prompt_budget(model, requested_tokens, reserved_tokens=0, completion_tokens=4000):
+    """Tokens available for variable prompt context.
+
+    requested_tokens is capped by what is left of the model's context window
+    after the completion, the fixed part of the prompt and a safety margin.
+    """
+    available = context_window(model) - completion_tokens - reserved_tokens - SAFETY_MARGIN_TOKENS
+    return max(0, min(requested_tokens, available))
+
+
+class UsageTracker:
+    """Per-run record of LLM calls: tokens and latency by node and section."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records = []
+
+    def record(self, node, section, prompt_tokens, completion_tokens, latency, cached=False, provider=""):
+        with self._lock:
+            self.records.append({
+                "node": node or "unknown",
+                "section": section,
+                "provider": provider,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "latency": latency,
+                "cached": cached,
+            })
+
+    @staticmethod
+    def _sum(records):
+        return {
+            "calls": len(records),
+            "cached_calls": sum(1 for r in records if r["cached"]),
+            "prompt_tokens": sum(r["prompt_tokens"] for r in records),
+            "completion_tokens": sum(r["completion_tokens"] for r in records),
+            "latency": round(sum(r["latency"] for r in records), 2),
+        }
+
+    def totals(self):
+        with self._lock:
+            return self._sum(list(self.records))
+
+    def _grouped(self, key):
+        with self._lock:
+            records = list(self.records)
+        groups = {}
+        for r in records:
+            groups.setdefault(key(r), []).append(r)
+        return {name: self._sum(group) for name, group in groups.items()}
+
+    def by_node(self):
+        return self._grouped(lambda r: r["node"])
+
+    def by_section(self):
+        return self._grouped(lambda r: r["section"] or "-")
+
+    def summary(self):
+        totals = self.totals()
+        lines = [
+            f"📊 LLM usage: {totals['calls']} calls ({totals['cached_calls']} cached), "
+            f"{totals['prompt_tokens']} prompt + {totals['completion_tokens']} completion tokens, "
+            f"{totals['latency']}s total latency"
+        ]
+        for node, stats in sorted(self.by_node().items()):
+            lines.append(f"   {node}: {stats['calls']} calls, {stats['prompt_tokens']}+{stats['completion_tokens']} tokens, {stats['latency']}s")
+        for section, stats in sorted(self.by_section().items(), key=lambda item: (len(item[0]), item[0])):
+            if section != "-":
+                lines.append(f"   section {section}: {stats['prompt_tokens']}+{stats['completion_tokens']} tokens, {stats['latency']}s")
+        return "\n".join(lines)
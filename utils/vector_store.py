@@ -1,9 +1,15 @@
+import os
 from langchain_ollama import OllamaEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from qdrant_client import QdrantClient, models
+import asyncio
+import hashlib
 import uuid
 import time
 
+# Chunks embedded and upserted per request
+UPSERT_BATCH = int(os.getenv("UPSERT_BATCH", "256"))
+
 class VectorStoreManager:
     def __init__(self, collection_name="documentation_store"):
         self.collection_name = collection_name
@@ -20,7 +26,12 @@ class VectorStoreManager:
         """Initialize Qdrant and Ollama services with error handling."""
         # Initialize Qdrant client
         try:
-            self.client = QdrantClient(host="localhost", port=6333)
+            qdrant_host = os.getenv("QDRANT_HOST", "localhost")
+            if qdrant_host == ":memory:":
+                # In-process store, handy for load tests without Docker
+                self.client = QdrantClient(location=":memory:")
+            else:
+                self.client = QdrantClient(host=qdrant_host, port=int(os.getenv("QDRANT_PORT", "6333")))
             # Test connection
             self.client.get_collections()
             print("✅ Connected to Qdrant successfully")
@@ -32,7 +43,10 @@ class VectorStoreManager:
 
         # Initialize Ollama embeddings
         try:
-            self.embeddings = OllamaEmbeddings(model="snowflake-arctic-embed2:568m")
+            self.embeddings = OllamaEmbeddings(
+                model=os.getenv("OLLAMA_EMBED_MODEL", "snowflake-arctic-embed2:568m"),
+                base_url=os.getenv("OLLAMA_BASE_URL")
+            )
             # Test embeddings
             test_embedding = self.embeddings.embed_query("test")
             if test_embedding:
@@ -61,7 +75,24 @@ class VectorStoreManager:
                 )
             )
 
-    def upsert_documents(self, pages_content):
+        # Retrieval is scoped to one crawl, and a recrawl looks up earlier embeddings by chunk hash
+        for field_name in ("corpus_id", "chunk_hash"):
+            try:
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field_name,
+                    field_schema=models.PayloadSchemaType.KEYWORD
+                )
+            except Exception as e:
+                print(f"⚠️  Could not create {field_name} payload index: {e}")
+
+    def upsert_documents(self, pages_content, corpus_id=None, previous_corpus_id=None):
+        """Chunk, embed and store pages. Chunks are tagged with corpus_id so a
+        generation can later retrieve from its own crawl only.
+
+        On a recrawl, chunks already stored under previous_corpus_id keep their
+        embedding: only new or changed chunks are sent to the embedding model.
+        """
         if not self.client or not self.embeddings:
             print("⚠️  Vector store or embeddings not available. Skipping document storage.")
             return 0
@@ -70,46 +101,124 @@ class VectorStoreManager:
         for page in pages_content:
             chunks = self.text_splitter.split_text(page['content'])
             for chunk in chunks:
+                chunk_hash = hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+                # Deterministic ids make re-upserting the same crawl idempotent
+                point_id = uuid.uuid5(uuid.NAMESPACE_URL, f"{corpus_id}:{page['url']}:{chunk_hash}")
                 documents.append({
-                    "id": str(uuid.uuid4()),
+                    "id": str(point_id),
                     "text": chunk,
-                    "metadata": {"source_url": page['url']}
+                    "metadata": {"source_url": page['url']},
+                    "corpus_id": corpus_id,
+                    "chunk_hash": chunk_hash
                 })
         
         if not documents:
             return 0
 
+        reused = 0
         try:
-            texts_to_embed = [doc['text'] for doc in documents]
-            vectors = self.embeddings.embed_documents(texts_to_embed)
+            # In batches, so only one batch of vectors is held in memory at a time
+            for start in range(0, len(documents), UPSERT_BATCH):
+                batch = documents[start:start + UPSERT_BATCH]
+                known = self.stored_vectors(previous_corpus_id, {doc['chunk_hash'] for doc in batch})
+                new_docs = [doc for doc in batch if doc['chunk_hash'] not in known]
+                if new_docs:
+                    embedded = self.embeddings.embed_documents([doc['text'] for doc in new_docs])
+                    known.update(zip((doc['chunk_hash'] for doc in new_docs), embedded))
+                reused += len(batch) - len(new_docs)
 
-            self.client.upsert(
-                collection_name=self.collection_name,
-                points=models.Batch(
-                    ids=[doc['id'] for doc in documents],
-                    vectors=vectors,
-                    payloads=[{"text": doc['text'], "metadata": doc['metadata']} for doc in documents]
-                ),
-                wait=True
-            )
+                self.client.upsert(
+                    collection_name=self.collection_name,
+                    points=models.Batch(
+                        ids=[doc['id'] for doc in batch],
+                        vectors=[known[doc['chunk_hash']] for doc in batch],
+                        payloads=[
+                            {"text": doc['text'], "metadata": doc['metadata'],
+                             "corpus_id": doc['corpus_id'], "chunk_hash": doc['chunk_hash']}
+                            for doc in batch
+                        ]
+                    ),
+                    wait=True
+                )
+            if previous_corpus_id:
+                print(f"♻️  Reused {reused} of {len(documents)} chunk embeddings from the previous crawl")
             return len(documents)
         except Exception as e:
             print(f"Error upserting documents: {e}")
             return 0
 
-    async def query(self, query_text, limit=5):
-        if not self.client or not self.embeddings:
+    def stored_vectors(self, corpus_id, chunk_hashes):
+        """chunk hash -> vector for those of chunk_hashes already stored under corpus_id."""
+        if not corpus_id or not chunk_hashes:
+            return {}
+        query_filter = models.Filter(must=[
+            models.FieldCondition(key="corpus_id", match=models.MatchValue(value=corpus_id)),
+            models.FieldCondition(key="chunk_hash", match=models.MatchAny(any=list(chunk_hashes)))
+        ])
+        vectors = {}
+        offset = None
+        try:
+            while True:
+                points, offset = self.client.scroll(
+                    collection_name=self.collection_name,
+                    scroll_filter=query_filter,
+                    limit=UPSERT_BATCH,
+                    offset=offset,
+                    with_payload=["chunk_hash"],
+                    with_vectors=True
+                )
+                for point in points:
+                    vectors[point.payload["chunk_hash"]] = point.vector
+                if offset is None:
+                    return vectors
+        except Exception as e:
+            # Embedding everything again is slower, not wrong
+            print(f"⚠️  Could not read stored embeddings: {e}")
+            return {}
+
+    def delete_corpus(self, corpus_id):
+        """Remove every chunk stored under corpus_id, once no tutorial retrieves from that crawl."""
+        if not self.client or not corpus_id:
+            return
+        try:
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=models.FilterSelector(filter=models.Filter(must=[
+                    models.FieldCondition(key="corpus_id", match=models.MatchValue(value=corpus_id))
+                ]))
+            )
+        except Exception as e:
+            print(f"⚠️  Could not delete chunks of corpus {corpus_id}: {e}")
+
+    @property
+    def available(self):
+        return bool(self.client and self.embeddings)
+
+    def search(self, query_text, limit=5, corpus_id=None):
+        """Return the payloads of the chunks closest to query_text, best match first."""
+        if not self.available:
             print("⚠️  Vector store or embeddings not available. Cannot perform query.")
             return []
             
         try:
             query_vector = self.embeddings.embed_query(query_text)
-            hits = self.client.search(
+            query_filter = None
+            if corpus_id:
+                query_filter = models.Filter(must=[
+                    models.FieldCondition(key="corpus_id", match=models.MatchValue(value=corpus_id))
+                ])
+            response = self.client.query_points(
                 collection_name=self.collection_name,
-                query_vector=query_vector,
-                limit=limit
+                query=query_vector,
+                query_filter=query_filter,
+                limit=limit,
+                with_payload=True
             )
-            return [hit.payload for hit in hits]
+            return [hit.payload for hit in response.points]
         except Exception as e:
             print(f"Error querying vector store: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    async def query(self, query_text, limit=5, corpus_id=None):
+        # Embedding and search are blocking calls, keep them off the event loop
+        return await asyncio.to_thread(self.search, query_text, limit, corpus_id)
\ No newline at end of file